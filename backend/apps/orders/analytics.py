@@ -0,0 +1,132 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import F, FilteredRelation, Q, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from .models import DailySales, ProductDailySales
+
+BUCKETS = ('day', 'week', 'month')
+REVENUE_STATUSES = ('completed', 'in_process')
+# Product velocity counts everything ordered and not cancelled
+SOLD_STATUSES = ('new', 'in_process', 'completed')
+PRODUCT_RANKINGS = ('units', 'revenue')
+
+def parse_date_range(params):
+    """Read optional ?start= and ?end= (YYYY-MM-DD) query parameters"""
+    dates = []
+    for name in ('start', 'end'):
+        value = params.get(name)
+        try:
+            day = parse_date(value) if value else None
+        except ValueError:
+            day = None
+        if value and day is None:
+            raise ValidationError({name: 'Use YYYY-MM-DD format'})
+        dates.append(day)
+    start, end = dates
+    if start and end and start > end:
+        raise ValidationError({'start': 'start must not be after end'})
+    return start, end
+
+def sales_totals(start=None, end=None, statuses=REVENUE_STATUSES):
+    """Revenue and order count over a date range, read from the daily rollup"""
+    rows = DailySales.objects.filter(status__in=statuses)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    return rows.aggregate(
+        total_revenue=Sum('revenue'),
+        total_orders=Coalesce(Sum('order_count'), Value(0)),
+    )
+
+def sales_series(start, end, bucket='day', statuses=REVENUE_STATUSES):
+    """Revenue, orders and items per day/week/month between two dates"""
+    rows = DailySales.objects.filter(
+        date__gte=start,
+        date__lte=end,
+        status__in=statuses,
+    ).annotate(
+        period=Trunc('date', bucket)
+    ).values('period').annotate(
+        revenue=Sum('revenue'),
+        orders=Sum('order_count'),
+        items=Sum('item_count'),
+    ).order_by('period')
+    return list(rows)
+
+def status_distribution(start=None, end=None):
+    """Order count per status (all history unless a range is given)"""
+    rows = DailySales.objects.all()
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    return list(
+        rows.values('status').annotate(count=Sum('order_count')).filter(count__gt=0).order_by('status')
+    )
+
+def dashboard(start=None, end=None, bucket='day'):
+    """Everything the admin dashboard shows, served from DailySales only"""
+    today = timezone.localdate()
+    end = end or today
+    start = start or end - timedelta(days=30)
+    return {
+        'daily_sales': sales_totals(today, today),
+        'weekly_sales': sales_totals(today - timedelta(days=7)),
+        'monthly_sales': sales_totals(today - timedelta(days=30)),
+        'range_sales': sales_totals(start, end),
+        'series': sales_series(start, end, bucket),
+        'status_distribution': status_distribution(),
+    }
+
+def default_window(start=None, end=None, days=30):
+    end = end or timezone.localdate()
+    return start or end - timedelta(days=days), end
+
+def product_sales(start, end, statuses=SOLD_STATUSES):
+    """ProductDailySales rows inside a window; cost depends on the window, not on order history"""
+    return ProductDailySales.objects.filter(date__gte=start, date__lte=end, status__in=statuses)
+
+def top_products(start, end, limit=10, by='units'):
+    """Best sellers over a window by units or revenue"""
+    rows = product_sales(start, end).values(
+        'product_id', product_name=F('product__name'),
+    ).annotate(
+        units=Sum('units'),
+        revenue=Sum('revenue'),
+    ).filter(units__gt=0).order_by(f'-{by}', 'product_name')
+    return list(rows[:limit])
+
+def slow_movers(start, end, limit=10):
+    """Products still on sale that sold least over a window, including those that sold nothing"""
+    from apps.products.models import Product
+    # The window goes into the LEFT JOIN's ON clause, so only in-window rollup rows are joined
+    rows = Product.objects.exclude(availability_status='discontinued').filter(
+        created_at__date__lte=end,
+    ).annotate(
+        window_sales=FilteredRelation('daily_sales', condition=Q(
+            daily_sales__date__gte=start,
+            daily_sales__date__lte=end,
+            daily_sales__status__in=SOLD_STATUSES,
+        )),
+    ).values(
+        'id', 'name', 'stock_quantity',
+    ).annotate(
+        units=Coalesce(Sum('window_sales__units'), Value(0)),
+        revenue=Coalesce(Sum('window_sales__revenue'), Value(Decimal('0.00'))),
+    ).order_by('units', '-stock_quantity', 'name')
+    return list(rows[:limit])
+
+def category_revenue(start, end):
+    """Units and line revenue per category over a window"""
+    rows = product_sales(start, end).values(
+        category_id=F('product__category_id'),
+        category_name=F('product__category__name'),
+    ).annotate(
+        units=Sum('units'),
+        revenue=Sum('revenue'),
+    ).order_by('-revenue', 'category_name')
+    return list(rows)
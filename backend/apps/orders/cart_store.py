@@ -0,0 +1,339 @@
+"""Shopping carts held in Django's cache with write-behind persistence.
+
+The cache (CART_CACHE_ALIAS; use Redis when running several workers) is the
+live copy of every active cart. Cart/CartItem rows are only written when a
+cart is flushed: at checkout, by the periodic flush task, or by the sweeper.
+A cart missing from the cache is reloaded from those rows.
+
+Cart lines are keyed by product. Each line also carries the id of the
+CartItem row it is (or will be) stored as: ids of new lines are reserved
+from the CartItem sequence without writing a row, so the cart API can
+address lines by CartItem id before the cart has ever been flushed.
+"""
+import secrets
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Sum, Value, When, Window
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from .models import Cart, CartItem
+from apps.products.models import Product
+
+LOCK_TIMEOUT = 5  # seconds a crashed request can hold a cart lock
+LOCK_WAIT = 2
+# Seconds a numbered dirty-log slot may stay unwritten before the flusher gives it up
+DIRTY_SLOT_GRACE = 30
+# Delete the lock only if it still holds our token, in one Redis round trip
+RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+class CartBusy(APIException):
+    status_code = 409
+    default_detail = 'The cart is being changed by another request, please try again'
+    default_code = 'cart_busy'
+
+def reserve_line_ids(count):
+    """Take ``count`` CartItem primary keys from the table's sequence (PostgreSQL)"""
+    if not count:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [CartItem._meta.db_table, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+class CartStore:
+    key_prefix = 'cart'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'CART_CACHE_ALIAS', 'default')]
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'CART_TTL', 60 * 60 * 24 * 14)
+
+    def key(self, customer_id):
+        return f'{self.key_prefix}:{customer_id}'
+
+    # Reading
+
+    def empty_state(self):
+        now = timezone.now()
+        return {'cart_id': None, 'created_at': now, 'updated_at': now, 'lines': {}, 'dirty': False}
+
+    def load_from_db(self, customer_id):
+        cart = Cart.objects.filter(customer_id=customer_id).first()
+        if cart is None:
+            return self.empty_state()
+        items = CartItem.objects.filter(cart=cart).order_by('added_at', 'id').values_list(
+            'pk', 'product_id', 'quantity', 'added_at'
+        )
+        return {
+            'cart_id': cart.pk,
+            'created_at': cart.created_at,
+            'updated_at': cart.updated_at,
+            'lines': {
+                product_id: {'id': pk, 'quantity': quantity, 'added_at': added_at}
+                for pk, product_id, quantity, added_at in items
+            },
+            'dirty': False,
+        }
+
+    def get(self, customer_id):
+        """Current cart state, from the cache or (on a miss) the database"""
+        state = self.cache.get(self.key(customer_id))
+        if state is None:
+            state = self.load_from_db(customer_id)
+            self.cache.add(self.key(customer_id), state, self.ttl)
+        return state
+
+    def find_line(self, customer_id, line_id):
+        """Product id of the cart line with this CartItem id, or None"""
+        for product_id, line in self.get(customer_id)['lines'].items():
+            if line.get('id') == line_id:
+                return product_id
+        return None
+
+    # Writing
+
+    @contextmanager
+    def lock(self, customer_id):
+        """Serialize writers of one cart across processes; raises CartBusy if it stays taken"""
+        lock_key = f'{self.key(customer_id)}:lock'
+        # An int token is stored verbatim by the Redis backend, so the release script can compare it
+        token = secrets.randbits(62)
+        deadline = time.monotonic() + LOCK_WAIT
+        while not self.cache.add(lock_key, token, LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise CartBusy()
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self.unlock(lock_key, token)
+
+    def unlock(self, lock_key, token):
+        """Release a lock unless it expired and another request has taken it since"""
+        client = getattr(self.cache, '_cache', None)
+        if hasattr(client, 'get_client'):
+            # django.core.cache.backends.redis: atomic compare-and-delete
+            key = self.cache.make_and_validate_key(lock_key)
+            client.get_client(key, write=True).eval(RELEASE_SCRIPT, 1, key, token)
+        elif self.cache.get(lock_key) == token:
+            self.cache.delete(lock_key)
+
+    @contextmanager
+    def mutate(self, customer_id):
+        """Yield the cart's lines for in-place changes, then store them and queue a flush"""
+        with self.lock(customer_id):
+            state = self.get(customer_id)
+            yield state['lines']
+            unnumbered = [line for line in state['lines'].values() if not line.get('id')]
+            for line, line_id in zip(unnumbered, reserve_line_ids(len(unnumbered))):
+                line['id'] = line_id
+            state['updated_at'] = timezone.now()
+            if not state['dirty']:
+                state['dirty'] = True
+                self.mark_dirty(customer_id)
+            self.cache.set(self.key(customer_id), state, self.ttl)
+
+    def add(self, customer_id, product_id, quantity):
+        with self.mutate(customer_id) as lines:
+            line = lines.setdefault(product_id, {'quantity': 0, 'added_at': timezone.now()})
+            line['quantity'] += quantity
+            return line['quantity']
+
+    def set_quantity(self, customer_id, product_id, quantity):
+        with self.mutate(customer_id) as lines:
+            lines[product_id]['quantity'] = quantity
+
+    def remove(self, customer_id, product_id):
+        with self.mutate(customer_id) as lines:
+            lines.pop(product_id, None)
+
+    def apply(self, customer_id, quantities, replace=False):
+        """Set many lines at once from {product_id: quantity}; 0 removes a line
+
+        With ``replace`` every line not listed is removed as well.
+        """
+        now = timezone.now()
+        with self.mutate(customer_id) as lines:
+            if replace:
+                for product_id in set(lines) - set(quantities):
+                    del lines[product_id]
+            for product_id, quantity in quantities.items():
+                if not quantity:
+                    lines.pop(product_id, None)
+                elif product_id in lines:
+                    lines[product_id]['quantity'] = quantity
+                else:
+                    lines[product_id] = {'quantity': quantity, 'added_at': now}
+
+    def clear(self, customer_id):
+        """Empty the cart in both the cache and the database"""
+        with self.lock(customer_id):
+            CartItem.objects.filter(cart__customer_id=customer_id).delete()
+            self.cache.delete(self.key(customer_id))
+
+    # Write-behind
+
+    def mark_dirty(self, customer_id):
+        """Append the customer to the dirty log the flusher walks
+
+        The slot is numbered before it is written; flush_dirty() waits for it.
+        """
+        seq_key = f'{self.key_prefix}:dirty:seq'
+        self.cache.add(seq_key, 0, None)
+        slot = self.cache.incr(seq_key)
+        self.cache.set(f'{self.key_prefix}:dirty:{slot}', customer_id, self.ttl)
+
+    def flush(self, customer_id):
+        """Write one cart back to Cart/CartItem if it has unsaved changes"""
+        with self.lock(customer_id):
+            state = self.cache.get(self.key(customer_id))
+            if state is None or not state['dirty']:
+                return False
+            state['cart_id'] = self.persist(customer_id, state)
+            state['dirty'] = False
+            self.cache.set(self.key(customer_id), state, self.ttl)
+        return True
+
+    @transaction.atomic
+    def persist(self, customer_id, state):
+        """Sync the cart's rows to ``state`` with bulk operations; returns the cart id"""
+        cart, _ = Cart.objects.get_or_create(
+            customer_id=customer_id, defaults={'created_at': state['created_at']}
+        )
+        lines = state['lines']
+        existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+
+        CartItem.objects.filter(cart=cart).exclude(product_id__in=list(lines)).delete()
+        changed = []
+        for product_id, line in lines.items():
+            item = existing.get(product_id)
+            if item is None:
+                continue
+            # A row written elsewhere wins; the line takes over its id
+            line['id'] = item.pk
+            if item.quantity != line['quantity']:
+                item.quantity = line['quantity']
+                changed.append(item)
+        CartItem.objects.bulk_update(changed, ['quantity'])
+        CartItem.objects.bulk_create([
+            CartItem(id=line.get('id'), cart=cart, product_id=product_id, quantity=line['quantity'],
+                     added_at=line['added_at'])
+            for product_id, line in lines.items() if product_id not in existing
+        ])
+        # Keep the last-activity time rather than the flush time
+        Cart.objects.filter(pk=cart.pk).update(updated_at=state['updated_at'])
+        return cart.pk
+
+    def flush_dirty(self, limit=5000):
+        """Persist every cart changed since the last run; returns how many were written"""
+        seq_key = f'{self.key_prefix}:dirty:seq'
+        done_key = f'{self.key_prefix}:dirty:done'
+        run_key = f'{self.key_prefix}:dirty:running'
+        gap_key = f'{self.key_prefix}:dirty:gap'
+        if not self.cache.add(run_key, 1, 300):
+            return 0  # another flusher is busy
+        try:
+            done = self.cache.get(done_key, 0)
+            head = min(self.cache.get(seq_key, 0), done + limit)
+            entries = self.cache.get_many(
+                [f'{self.key_prefix}:dirty:{slot}' for slot in range(done + 1, head + 1)]
+            )
+
+            # A missing slot may be numbered but not yet written: stop in front of it
+            # until it has been missing for DIRTY_SLOT_GRACE, then take it as lost.
+            # The gap remembers the head when it was first seen and when that was.
+            now = time.time()
+            gap = self.cache.get(gap_key)
+            given_up = gap[0] if gap and now - gap[1] > DIRTY_SLOT_GRACE else done
+            reached = done
+            for slot in range(done + 1, head + 1):
+                if f'{self.key_prefix}:dirty:{slot}' not in entries and slot > given_up:
+                    if gap is None or gap[0] < slot:
+                        self.cache.set(gap_key, (head, now), None)
+                    break
+                reached = slot
+            else:
+                if gap:
+                    self.cache.delete(gap_key)
+
+            slots = [f'{self.key_prefix}:dirty:{slot}' for slot in range(done + 1, reached + 1)]
+            customer_ids = {entries[key] for key in slots if key in entries}
+            flushed = 0
+            for customer_id in customer_ids:
+                try:
+                    if self.flush(customer_id):
+                        flushed += 1
+                except CartBusy:
+                    # Still dirty; log it again so the next run picks it up
+                    self.mark_dirty(customer_id)
+            self.cache.delete_many(slots)
+            self.cache.set(done_key, reached, None)
+            return flushed
+        finally:
+            self.cache.delete(run_key)
+
+    def sweep(self, abandoned_after=None):
+        """Flush pending carts, then drop carts nobody has touched for a while
+
+        The flush may have written nothing (another flusher running, a busy
+        cart, more slots than one run takes), so each candidate is re-checked
+        under its lock against the cached state before anything is deleted.
+        """
+        abandoned_after = abandoned_after or timedelta(
+            days=getattr(settings, 'CART_ABANDON_AFTER_DAYS', 30)
+        )
+        cutoff = timezone.now() - abandoned_after
+        self.flush_dirty()
+        candidates = list(Cart.objects.filter(updated_at__lt=cutoff).values_list('pk', 'customer_id'))
+        swept = 0
+        for cart_id, customer_id in candidates:
+            try:
+                with self.lock(customer_id):
+                    state = self.cache.get(self.key(customer_id))
+                    if state is not None and (state['dirty'] or state['updated_at'] >= cutoff):
+                        continue
+                    # The row may have been flushed since the candidates were read
+                    deleted, _ = Cart.objects.filter(pk=cart_id, updated_at__lt=cutoff).delete()
+                    if deleted:
+                        self.cache.delete(self.key(customer_id))
+                        swept += 1
+            except CartBusy:
+                # Someone is using the cart right now, so it is not abandoned
+                continue
+        return swept
+
+def priced_lines(lines):
+    """Products in a cart with each line's quantity and total plus the cart totals, in one query
+
+    Every row carries ``cart_quantity``, ``line_total``, ``cart_total_items``
+    and ``cart_total_price``; the last two are window sums over the cart.
+    """
+    if not lines:
+        return []
+    quantity = Case(
+        *[When(pk=product_id, then=Value(line['quantity'])) for product_id, line in lines.items()],
+        output_field=models.IntegerField(),
+    )
+    line_total = models.ExpressionWrapper(
+        F('price') * F('cart_quantity'), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+    return list(
+        Product.objects.filter(pk__in=list(lines)).select_related('category').annotate(
+            cart_quantity=quantity,
+        ).annotate(
+            line_total=line_total,
+            cart_total_items=Window(Sum('cart_quantity')),
+            cart_total_price=Window(Sum(line_total)),
+        )
+    )
+
+cart_store = CartStore()
@@ -0,0 +1,152 @@
+from collections import Counter, OrderedDict
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+from .models import Order, OrderItem
+from .reservations import release, with_available_stock
+from apps.products.alerts import is_low, note_stock_changes
+from apps.products.catalog import bump_catalog_version
+from apps.products.search import log_product_changes
+
+def normalize_lines(items_data):
+    """Collapse raw checkout items into an ordered {product_id: quantity} map"""
+    lines = OrderedDict()
+    for item_data in items_data:
+        try:
+            product_id = int(item_data['product_id'])
+            quantity = int(item_data['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                "Each item needs an integer product_id and quantity"
+            )
+        if quantity < 1:
+            raise serializers.ValidationError(
+                f"Quantity for product {product_id} must be at least 1"
+            )
+        lines[product_id] = lines.get(product_id, 0) + quantity
+
+    if not lines:
+        raise serializers.ValidationError("Order must contain at least one item")
+    return lines
+
+def lock_products(product_ids, customer_id=None):
+    """Load and row-lock every product of an order in one query (pk order avoids deadlocks)
+
+    Products carry ``available_quantity``: stock minus other customers' holds.
+    """
+    from apps.products.models import Product
+    locked = Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk')
+    return OrderedDict(
+        (product.pk, product)
+        for product in with_available_stock(locked, customer_id)
+    )
+
+def check_stock(lines, products):
+    """Validate every line at once, reporting all problems together"""
+    errors = []
+    for product_id, quantity in lines.items():
+        product = products.get(product_id)
+        if product is None:
+            errors.append(f"Product with id {product_id} not found")
+        elif product.available_quantity < quantity:
+            errors.append(
+                f"Not enough stock for {product.name}. Available: {max(product.available_quantity, 0)}"
+            )
+    if errors:
+        raise serializers.ValidationError(errors)
+
+def decrement_stock(lines, products):
+    """Apply all decrements in a single conditional UPDATE.
+
+    Each row only matches while it still holds enough stock, so a concurrent
+    writer that bypassed the row lock can never drive stock negative. A short
+    count means some line lost the race and the whole checkout is aborted.
+    """
+    from apps.products.models import Category, Product
+    guard = Q()
+    for product_id, quantity in lines.items():
+        guard |= Q(pk=product_id, stock_quantity__gte=quantity)
+
+    sold_out = [
+        product_id for product_id, quantity in lines.items()
+        if products[product_id].stock_quantity == quantity
+    ]
+
+    updated = Product.objects.filter(guard).update(
+        stock_quantity=Case(
+            *[When(pk=product_id, then=F('stock_quantity') - quantity)
+              for product_id, quantity in lines.items()],
+            output_field=PositiveIntegerField(),
+        ),
+        availability_status=Case(
+            When(pk__in=sold_out, availability_status='available', then=Value('out_of_stock')),
+            default=F('availability_status'),
+        ),
+        updated_at=timezone.now(),
+    )
+    if updated != len(lines):
+        raise serializers.ValidationError("Stock changed during checkout, please try again")
+
+    # Sold-out products no longer count as available in their category
+    delisted = Counter()
+    for product_id in sold_out:
+        if products[product_id].availability_status == 'available':
+            delisted[products[product_id].category_id] -= 1
+    Category.objects.adjust_available_counts(delisted)
+    log_product_changes(sold_out)
+    note_stock_changes([
+        (product_id,
+         is_low(products[product_id].stock_quantity, products[product_id].low_stock_threshold),
+         is_low(products[product_id].stock_quantity - quantity, products[product_id].low_stock_threshold))
+        for product_id, quantity in lines.items()
+    ])
+    bump_catalog_version()
+
+@transaction.atomic
+def place_order(customer, items_data, **order_fields):
+    """Create an order with all of its lines as one unit of work.
+
+    Query cost is constant in the number of lines: one locking SELECT for the
+    products (which also sums other customers' stock holds), one UPDATE for
+    the stock, one bulk INSERT each for the order items and stock movements,
+    one totals refresh, an INSERT and an UPDATE for the product sales rollup
+    and one DELETE of the customer's holds. Any failure rolls the whole order
+    back.
+    """
+    from apps.products.models import StockMovement
+    lines = normalize_lines(items_data)
+    products = lock_products(list(lines), customer.pk)
+    check_stock(lines, products)
+
+    order = Order.objects.create(customer=customer, **order_fields)
+    decrement_stock(lines, products)
+
+    order_items = []
+    movements = []
+    for product_id, quantity in lines.items():
+        product = products[product_id]
+        order_items.append(OrderItem(
+            order=order,
+            product=product,
+            product_name=product.name,
+            product_unit=product.unit,
+            quantity=quantity,
+            price_per_unit=product.price,
+        ))
+        movements.append(StockMovement(
+            product=product,
+            movement_type='out',
+            quantity=-quantity,
+            previous_stock=product.stock_quantity,
+            new_stock=product.stock_quantity - quantity,
+            reason=f'Order {order.order_number}',
+            created_by=None,
+        ))
+
+    # bulk_create recomputes the order totals once for the whole batch
+    OrderItem.objects.bulk_create(order_items)
+    StockMovement.objects.bulk_create(movements)
+    # The customer's holds on these products are now real decrements
+    release(customer.pk, lines)
+    return order
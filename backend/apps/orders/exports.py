@@ -0,0 +1,116 @@
+import csv
+import json
+from itertools import groupby
+from operator import itemgetter
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = (
+    ('id', 'id'),
+    ('order_number', 'order_number'),
+    ('customer_id', 'customer_id'),
+    ('customer_username', 'customer__username'),
+    ('status', 'status'),
+    ('delivery_date', 'delivery_date'),
+    ('subtotal', 'subtotal'),
+    ('tax', 'tax'),
+    ('total', 'total'),
+    ('created_at', 'created_at'),
+)
+
+ORDER_ITEM_COLUMNS = (
+    ('item_id', 'items__id'),
+    ('product_id', 'items__product_id'),
+    ('product_name', 'items__product_name'),
+    ('product_unit', 'items__product_unit'),
+    ('quantity', 'items__quantity'),
+    ('price_per_unit', 'items__price_per_unit'),
+    ('total_price', 'items__total_price'),
+)
+
+STOCK_MOVEMENT_COLUMNS = (
+    ('id', 'id'),
+    ('product_id', 'product_id'),
+    ('product_name', 'product__name'),
+    ('movement_type', 'movement_type'),
+    ('quantity', 'quantity'),
+    ('previous_stock', 'previous_stock'),
+    ('new_stock', 'new_stock'),
+    ('reason', 'reason'),
+    ('created_at', 'created_at'),
+    ('created_by', 'created_by__username'),
+)
+
+EMPTY_ITEM = (None,) * len(ORDER_ITEM_COLUMNS)
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv rows"""
+
+    def write(self, value):
+        return value
+
+def _names(columns):
+    return [name for name, _ in columns]
+
+def _lookups(columns):
+    return [lookup for _, lookup in columns]
+
+def streaming_export(lines, filename, export_format='ndjson'):
+    """Wrap exported lines in a download response"""
+    from django.http import StreamingHttpResponse
+    if export_format == 'csv':
+        response = StreamingHttpResponse(lines, content_type='text/csv')
+        filename = f'{filename}.csv'
+    else:
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        filename = f'{filename}.ndjson'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+def order_export_rows(orders):
+    """Yield (order row, [item rows]) from a single join streamed off one server-side cursor"""
+    width = len(ORDER_COLUMNS)
+    rows = orders.order_by('id', 'items__id').values_list(
+        *_lookups(ORDER_COLUMNS), *_lookups(ORDER_ITEM_COLUMNS)
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for _, group in groupby(rows, key=itemgetter(0)):
+        group = list(group)
+        items = [row[width:] for row in group if row[width] is not None]
+        yield group[0][:width], items
+
+def export_orders(orders, export_format='ndjson'):
+    """Stream orders with their items as NDJSON (one order per line) or CSV (one item per line)"""
+    if export_format == 'csv':
+        return csv_lines(
+            _names(ORDER_COLUMNS) + _names(ORDER_ITEM_COLUMNS),
+            (order + item for order, items in order_export_rows(orders) for item in (items or [EMPTY_ITEM])),
+        )
+
+    order_names = _names(ORDER_COLUMNS)
+    item_names = _names(ORDER_ITEM_COLUMNS)
+    return ndjson_lines(
+        dict(zip(order_names, order), items=[dict(zip(item_names, item)) for item in items])
+        for order, items in order_export_rows(orders)
+    )
+
+def export_stock_movements(movements, export_format='ndjson'):
+    """Stream stock movements as NDJSON or CSV from one server-side cursor"""
+    rows = movements.order_by('id').values_list(
+        *_lookups(STOCK_MOVEMENT_COLUMNS)
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    names = _names(STOCK_MOVEMENT_COLUMNS)
+    if export_format == 'csv':
+        return csv_lines(names, rows)
+    return ndjson_lines(dict(zip(names, row)) for row in rows)
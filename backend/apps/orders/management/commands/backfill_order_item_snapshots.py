@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from apps.orders.models import OrderItem
+from apps.products.models import Product
+
+class Command(BaseCommand):
+    help = 'Copy product name and unit onto order items created before line snapshots existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product = Product.objects.filter(pk=OuterRef('product_id'))
+        total = 0
+        last_id = 0
+
+        # Walk the primary key in ranges so each UPDATE stays short
+        while True:
+            ids = list(
+                OrderItem.objects.filter(pk__gt=last_id, product_name='')
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            total += OrderItem.objects.filter(pk__in=ids).update(
+                product_name=Subquery(product.values('name')[:1]),
+                product_unit=Subquery(product.values('unit')[:1]),
+            )
+            last_id = ids[-1]
+            self.stdout.write(f'  {total} order items backfilled')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {total} order items'))
@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from apps.accounts.models import User
+from apps.products.models import Category, Product
+from apps.orders.checkout import place_order
+
+class Command(BaseCommand):
+    help = 'Measure checkout throughput for 1, 10 and 100-line orders (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--orders', type=int, default=50, help='Orders placed per size')
+
+    def handle(self, *args, **options):
+        sizes = options['sizes']
+        runs = options['orders']
+
+        with transaction.atomic():
+            customer = User.objects.create_user(username='__checkout_bench__', user_type='customer')
+            category = Category.objects.create(name='__checkout_bench__')
+            products = Product.objects.bulk_create([
+                Product(
+                    name=f'Bench product {i}',
+                    category=category,
+                    description='',
+                    price=Decimal('2.50'),
+                    stock_quantity=10 ** 6,
+                )
+                for i in range(max(sizes))
+            ])
+            delivery_date = timezone.now().date() + timedelta(days=1)
+
+            self.stdout.write(f"{'lines':>6} {'orders/s':>10} {'lines/s':>10} {'ms/order':>10} {'queries':>8}")
+            for size in sizes:
+                items = [{'product_id': p.pk, 'quantity': 1} for p in products[:size]]
+                with CaptureQueriesContext(connection) as ctx:
+                    place_order(customer, items, delivery_date=delivery_date, delivery_address='bench')
+                queries = len(ctx.captured_queries)
+
+                started = time.perf_counter()
+                for _ in range(runs):
+                    place_order(customer, items, delivery_date=delivery_date, delivery_address='bench')
+                elapsed = time.perf_counter() - started
+
+                self.stdout.write(
+                    f"{size:>6} {runs / elapsed:>10.1f} {runs * size / elapsed:>10.1f} "
+                    f"{elapsed / runs * 1000:>10.2f} {queries:>8}"
+                )
+
+            transaction.set_rollback(True)
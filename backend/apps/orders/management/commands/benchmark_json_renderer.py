@@ -0,0 +1,98 @@
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from config.renderers import FastJSONRenderer
+
+def order_payload(orders, lines):
+    """Shaped like OrderListSerializer output, plus raw Decimal/date values as views return them"""
+    now = timezone.now()
+    return {
+        'next': None,
+        'results': [
+            {
+                'id': i,
+                'items': [
+                    {
+                        'id': i * lines + j,
+                        'product_name': f'Heirloom tomato {j}  ',
+                        'product_unit': 'kg',
+                        'quantity': j + 1,
+                        'price_per_unit': '3.40',
+                        'total_price': f'{(j + 1) * Decimal("3.40")}',
+                        'order': i,
+                        'product': j,
+                    }
+                    for j in range(lines)
+                ],
+                'customer_name': 'Green Grocer Ltd',
+                'customer_email': 'orders@example.com',
+                'order_number': f'ORD-20240301-{i:05d}',
+                'status': 'new',
+                'delivery_date': date(2024, 3, 2),
+                'subtotal': Decimal('123.40'),
+                'tax': Decimal('12.34'),
+                'total': Decimal('135.74'),
+                'created_at': now - timedelta(minutes=i),
+                'updated_at': now,
+                'customer': i % 50,
+            }
+            for i in range(orders)
+        ],
+    }
+
+def catalog_payload(products):
+    return [
+        {
+            'id': i,
+            'category_name': 'Vegetables',
+            'is_low_stock': i % 7 == 0,
+            'is_available': True,
+            'name': f'Carrot bunch {i}',
+            'description': 'Fresh from the farm, washed and bunched. Großartig!',
+            'price': '2.10',
+            'stock_quantity': i * 3,
+            'unit': 'bunch',
+            'image': None,
+            'availability_status': 'available',
+            'low_stock_threshold': 10,
+            'created_at': datetime(2024, 1, 1, 8, 30, tzinfo=dt_timezone.utc),
+            'updated_at': '2024-03-01T06:00:00Z',
+            'category': 1,
+            'sku_uuid': uuid.UUID(int=i),
+        }
+        for i in range(products)
+    ]
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSONRenderer with FastJSONRenderer on large order and catalog payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--lines', type=int, default=20)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def time_render(self, renderer, payload, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            output = renderer.render(payload)
+        return (time.perf_counter() - started) / repeat * 1000, output
+
+    def handle(self, *args, **options):
+        payloads = {
+            'orders': order_payload(options['orders'], options['lines']),
+            'catalog': catalog_payload(options['products']),
+        }
+        self.stdout.write(f"{'payload':>8} {'bytes':>10} {'drf ms':>8} {'fast ms':>8} {'speedup':>8}")
+        for name, payload in payloads.items():
+            drf_ms, expected = self.time_render(JSONRenderer(), payload, options['repeat'])
+            fast_ms, output = self.time_render(FastJSONRenderer(), payload, options['repeat'])
+            if output != expected:
+                raise CommandError(f'FastJSONRenderer output differs from JSONRenderer for {name}')
+            self.stdout.write(
+                f"{name:>8} {len(output):>10} {drf_ms:>8.1f} {fast_ms:>8.1f} {drf_ms / fast_ms:>7.1f}x"
+            )
@@ -0,0 +1,60 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from apps.accounts.models import User
+from apps.products.models import Category, Product
+from apps.orders.models import Order, OrderItem
+from apps.orders.serializers import OrderListSerializer, OrderSerializer
+
+class Command(BaseCommand):
+    help = 'Compare query counts and time of the naive and lean order-list paths (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 50, 200])
+        parser.add_argument('--lines', type=int, default=10, help='Lines per order')
+        parser.add_argument('--customers', type=int, default=20)
+
+    def measure(self, serializer_class, queryset):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            serializer_class(queryset, many=True).data
+            elapsed = time.perf_counter() - started
+        return len(ctx.captured_queries), elapsed * 1000
+
+    def handle(self, *args, **options):
+        page_sizes = options['page_sizes']
+        lines = options['lines']
+
+        with transaction.atomic():
+            category = Category.objects.create(name='__list_bench__')
+            products = Product.objects.bulk_create([
+                Product(name=f'Bench product {i}', category=category, description='',
+                        price=Decimal('1.75'), stock_quantity=1000)
+                for i in range(lines)
+            ])
+            customers = [
+                User.objects.create_user(username=f'__list_bench_{i}__', first_name='Bench',
+                                         last_name=str(i), user_type='customer')
+                for i in range(options['customers'])
+            ]
+            delivery_date = timezone.now().date() + timedelta(days=1)
+            for i in range(max(page_sizes)):
+                order = Order.objects.create(customer=customers[i % len(customers)],
+                                             delivery_date=delivery_date, delivery_address='bench')
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=product, quantity=2, price_per_unit=product.price)
+                    for product in products
+                ])
+
+            bench_orders = Order.objects.filter(customer__in=customers)
+            self.stdout.write(f"{'page':>6} {'naive q':>8} {'naive ms':>9} {'lean q':>7} {'lean ms':>8}")
+            for size in page_sizes:
+                naive = self.measure(OrderSerializer, bench_orders[:size])
+                lean = self.measure(OrderListSerializer, bench_orders.for_listing()[:size])
+                self.stdout.write(f"{size:>6} {naive[0]:>8} {naive[1]:>9.1f} {lean[0]:>7} {lean[1]:>8.1f}")
+
+            transaction.set_rollback(True)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from apps.orders.statements import statement_orders, stream_statement_zip
+
+class Command(BaseCommand):
+    help = 'Render invoice PDFs for every order in a date range into one ZIP archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', help='First day (YYYY-MM-DD)')
+        parser.add_argument('end', help='Last day (YYYY-MM-DD)')
+        parser.add_argument('--output', help='Archive path (default statements_<start>_<end>.zip)')
+        parser.add_argument('--workers', type=int, help='Render processes (default: CPU count)')
+        parser.add_argument('--customer', type=int, nargs='*', help='Limit to these customer ids')
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start'])
+        end = parse_date(options['end'])
+        if start is None or end is None or start > end:
+            raise CommandError('start and end must be YYYY-MM-DD with start <= end')
+
+        orders = statement_orders(start, end, options['customer'])
+        total = orders.count()
+        output = options['output'] or f'statements_{start}_{end}.zip'
+        self.stdout.write(f'Rendering {total} invoices into {output}')
+
+        stats = {'done': 0, 'elapsed': 0.0}
+
+        def progress(done, elapsed):
+            stats.update(done=done, elapsed=elapsed)
+            if done % 50 == 0 or done == total:
+                self.stdout.write(f'  {done}/{total} PDFs, {done / elapsed:.1f} PDFs/s')
+
+        with open(output, 'wb') as archive:
+            for chunk in stream_statement_zip(orders, options['workers'], progress):
+                archive.write(chunk)
+
+        rate = stats['done'] / stats['elapsed'] if stats['elapsed'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {stats['done']} PDFs to {output} in {stats['elapsed']:.1f}s ({rate:.1f} PDFs/s)"
+        ))
@@ -0,0 +1,85 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils.dateparse import parse_date
+from apps.orders.models import DailySales, Order, OrderItem, ProductDailySales
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the DailySales and ProductDailySales rollups from orders (whole history or a date range)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD)')
+
+    def parse_day(self, value, name):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'--{name} must be YYYY-MM-DD')
+        return day
+
+    def handle(self, *args, **options):
+        start = self.parse_day(options['start'], 'start')
+        end = self.parse_day(options['end'], 'end')
+
+        orders = Order.objects.order_by()
+        items = OrderItem.objects.order_by()
+        rollup = DailySales.objects.all()
+        product_rollup = ProductDailySales.objects.all()
+        if start:
+            orders = orders.filter(created_at__date__gte=start)
+            items = items.filter(order__created_at__date__gte=start)
+            rollup = rollup.filter(date__gte=start)
+            product_rollup = product_rollup.filter(date__gte=start)
+        if end:
+            orders = orders.filter(created_at__date__lte=end)
+            items = items.filter(order__created_at__date__lte=end)
+            rollup = rollup.filter(date__lte=end)
+            product_rollup = product_rollup.filter(date__lte=end)
+
+        buckets = defaultdict(lambda: {'revenue': Decimal('0.00'), 'order_count': 0, 'item_count': 0})
+        order_rows = orders.annotate(day=TruncDate('created_at')).values('day', 'status').annotate(
+            revenue=Sum('total'),
+            order_count=Count('id'),
+        )
+        for row in order_rows:
+            bucket = buckets[(row['day'], row['status'])]
+            bucket['revenue'] = row['revenue'] or Decimal('0.00')
+            bucket['order_count'] = row['order_count']
+
+        item_rows = items.annotate(day=TruncDate('order__created_at')).values('day', 'order__status').annotate(
+            item_count=Count('id'),
+        )
+        for row in item_rows:
+            buckets[(row['day'], row['order__status'])]['item_count'] = row['item_count']
+
+        product_rows = items.annotate(day=TruncDate('order__created_at')).values(
+            'day', 'product_id', 'order__status'
+        ).annotate(
+            units=Sum('quantity'),
+            revenue=Sum('total_price'),
+            line_count=Count('id'),
+        )
+        product_buckets = [
+            ProductDailySales(date=row['day'], product_id=row['product_id'], status=row['order__status'],
+                              units=row['units'], revenue=row['revenue'], line_count=row['line_count'])
+            for row in product_rows
+        ]
+
+        with transaction.atomic():
+            deleted, _ = rollup.delete()
+            DailySales.objects.bulk_create([
+                DailySales(date=day, status=status, **values)
+                for (day, status), values in buckets.items()
+            ], batch_size=1000)
+            product_deleted, _ = product_rollup.delete()
+            ProductDailySales.objects.bulk_create(product_buckets, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Replaced {deleted} rollup rows with {len(buckets)} rebuilt rows, '
+            f'{product_deleted} product rollup rows with {len(product_buckets)}'
+        ))
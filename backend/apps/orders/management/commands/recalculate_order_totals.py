@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from apps.orders.models import Order
+
+class Command(BaseCommand):
+    help = 'Rebuild order subtotal/tax/total from their items (repair for incrementally kept totals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('order_ids', type=int, nargs='*', help='Limit the repair to these orders')
+        parser.add_argument('--since', help='Only orders created on or after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['order_ids']:
+            orders = orders.filter(pk__in=options['order_ids'])
+        if options['since']:
+            orders = orders.filter(created_at__date__gte=options['since'])
+
+        updated = orders.recalculate_totals()
+        self.stdout.write(self.style.SUCCESS(f'Recalculated totals for {updated} orders'))
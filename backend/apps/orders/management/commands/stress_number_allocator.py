@@ -0,0 +1,70 @@
+import multiprocessing
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from apps.orders.models import NumberSequence
+from apps.orders.numbering import NumberAllocator
+
+STRESS_KEY = '__stress__'
+
+def _worker(args):
+    """Allocate numbers from several threads in one forked process"""
+    threads, per_thread, block_size = args
+    allocator = NumberAllocator(STRESS_KEY, 'STR', block_size=block_size)
+    results = [[] for _ in range(threads)]
+
+    def run(out):
+        for _ in range(per_thread):
+            out.append(allocator.allocate_value()[1])
+
+    pool = [threading.Thread(target=run, args=(out,)) for out in results]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    connections.close_all()
+    return results, allocator.leases
+
+class Command(BaseCommand):
+    help = 'Hammer the order/invoice number allocator from many processes and threads and check uniqueness'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--count', type=int, default=1000, help='Numbers allocated per thread')
+        parser.add_argument('--block-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        threads = options['threads']
+        count = options['count']
+
+        NumberSequence.objects.filter(key=STRESS_KEY).delete()
+        # Children must not share the parent's database sockets
+        connections.close_all()
+
+        started = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            outcomes = pool.map(_worker, [(threads, count, options['block_size'])] * processes)
+        elapsed = time.perf_counter() - started
+
+        values = []
+        leases = 0
+        for results, worker_leases in outcomes:
+            leases += worker_leases
+            for sequence in results:
+                if sequence != sorted(sequence):
+                    raise CommandError('Numbers within a thread were not monotonic')
+                values.extend(sequence)
+
+        NumberSequence.objects.filter(key=STRESS_KEY).delete()
+
+        duplicates = len(values) - len(set(values))
+        if duplicates:
+            raise CommandError(f'{duplicates} duplicate numbers allocated')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(values)} unique numbers from {processes} processes x {threads} threads '
+            f'in {elapsed:.2f}s ({len(values) / elapsed:.0f}/s, {leases} block leases)'
+        ))
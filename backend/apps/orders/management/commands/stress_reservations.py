@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import serializers
+from apps.accounts.models import User
+from apps.orders.checkout import place_order
+from apps.orders.models import Order, StockReservation
+from apps.orders.reservations import InsufficientStock, hold, release
+from apps.products.models import Category, Product
+
+STRESS_PREFIX = '__stress_reservations__'
+
+class Command(BaseCommand):
+    help = 'Simulate many shoppers competing for scarce products and check that holds never oversell'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shoppers', type=int, default=50)
+        parser.add_argument('--products', type=int, default=3)
+        parser.add_argument('--stock', type=int, default=20, help='Starting stock per product')
+        parser.add_argument('--rounds', type=int, default=20, help='Cart attempts per shopper')
+        parser.add_argument('--checkout-rate', type=float, default=0.5,
+                            help='Share of successful holds that go on to check out')
+
+    def setup(self, options):
+        category = Category.objects.create(name=STRESS_PREFIX)
+        products = Product.objects.bulk_create([
+            Product(name=f'{STRESS_PREFIX}{n}', category=category, description='', price=1,
+                    stock_quantity=options['stock'])
+            for n in range(options['products'])
+        ])
+        shoppers = User.objects.bulk_create([
+            User(username=f'{STRESS_PREFIX}{n}', user_type='customer')
+            for n in range(options['shoppers'])
+        ])
+        return category, products, shoppers
+
+    def cleanup(self):
+        for order in Order.objects.filter(customer__username__startswith=STRESS_PREFIX):
+            order.delete()
+        User.objects.filter(username__startswith=STRESS_PREFIX).delete()
+        Category.objects.filter(name=STRESS_PREFIX).delete()
+
+    def handle(self, *args, **options):
+        self.cleanup()
+        _, products, shoppers = self.setup(options)
+        product_ids = [product.pk for product in products]
+        lock = threading.Lock()
+        stats = Counter()
+        sold = Counter()
+        delivery_date = (timezone.now() + timedelta(days=1)).date()
+
+        def shop(shopper):
+            rng = random.Random(shopper.pk)
+            try:
+                for _ in range(options['rounds']):
+                    product_id = rng.choice(product_ids)
+                    quantity = rng.randint(1, 3)
+                    try:
+                        hold(shopper.pk, {product_id: quantity})
+                    except InsufficientStock:
+                        with lock:
+                            stats['rejected'] += 1
+                        continue
+
+                    if rng.random() >= options['checkout_rate']:
+                        release(shopper.pk, [product_id])
+                        with lock:
+                            stats['abandoned'] += 1
+                        continue
+
+                    try:
+                        place_order(shopper, [{'product_id': product_id, 'quantity': quantity}],
+                                    delivery_date=delivery_date, delivery_address=STRESS_PREFIX)
+                    except serializers.ValidationError:
+                        # A checkout backed by a live hold must never fail
+                        with lock:
+                            stats['failed_checkouts'] += 1
+                        continue
+                    with lock:
+                        stats['orders'] += 1
+                        sold[product_id] += quantity
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['shoppers']) as pool:
+                list(pool.map(shop, shoppers))
+            elapsed = time.perf_counter() - started
+
+            problems = []
+            if stats['failed_checkouts']:
+                problems.append(f"{stats['failed_checkouts']} checkouts failed despite holding stock")
+            for product in Product.objects.filter(pk__in=product_ids):
+                if product.stock_quantity != options['stock'] - sold[product.pk]:
+                    problems.append(
+                        f'{product.name}: stock {product.stock_quantity}, expected '
+                        f"{options['stock'] - sold[product.pk]}"
+                    )
+            leftover = StockReservation.objects.filter(product_id__in=product_ids).aggregate(
+                total=Sum('quantity')
+            )['total']
+            if leftover:
+                problems.append(f'{leftover} units still held after every shopper finished')
+        finally:
+            self.cleanup()
+
+        if problems:
+            raise CommandError('; '.join(problems))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['shoppers']} shoppers x {options['rounds']} rounds in {elapsed:.2f}s: "
+            f"{stats['orders']} orders ({sum(sold.values())} units sold), "
+            f"{stats['rejected']} holds refused, {stats['abandoned']} abandoned, no oversell"
+        ))
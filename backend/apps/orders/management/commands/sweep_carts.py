@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from apps.orders.cart_store import cart_store
+
+class Command(BaseCommand):
+    help = 'Flush cached carts to the database and delete abandoned carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flush-only', action='store_true', help='Only write pending carts back')
+        parser.add_argument('--days', type=int, help='Carts idle this many days are abandoned (default CART_ABANDON_AFTER_DAYS)')
+
+    def handle(self, *args, **options):
+        if options['flush_only']:
+            flushed = cart_store.flush_dirty()
+            self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} carts'))
+            return
+
+        abandoned_after = timedelta(days=options['days']) if options['days'] else None
+        removed = cart_store.sweep(abandoned_after)
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} abandoned carts'))
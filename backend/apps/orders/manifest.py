@@ -0,0 +1,120 @@
+import csv
+import io
+from itertools import groupby
+from xml.sax.saxutils import escape
+from django.db.models import Count, Sum
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from .exports import Echo
+from .models import OrderItem
+
+PACKING_STATUSES = ('new', 'in_process')
+
+MANIFEST_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+])
+
+def _day_items(delivery_date, statuses=PACKING_STATUSES):
+    return OrderItem.objects.filter(
+        order__delivery_date=delivery_date,
+        order__status__in=statuses,
+    )
+
+def picking_manifest(delivery_date, statuses=PACKING_STATUSES):
+    """Total quantity per product and unit for a delivery day, in one GROUP BY"""
+    return list(
+        _day_items(delivery_date, statuses).values(
+            'product_id', 'product__name', 'product__unit'
+        ).annotate(
+            total_quantity=Sum('quantity'),
+            order_count=Count('order_id', distinct=True),
+        ).order_by('product__name', 'product__unit')
+    )
+
+def packing_lists(delivery_date, statuses=PACKING_STATUSES):
+    """Per-order packing lists for a delivery day, built from one query"""
+    rows = _day_items(delivery_date, statuses).order_by(
+        'order__order_number', 'product__name'
+    ).values_list(
+        'order_id', 'order__order_number', 'order__customer__first_name',
+        'order__customer__last_name', 'order__customer__username',
+        'order__delivery_address', 'product__name', 'product__unit', 'quantity',
+    ).iterator(chunk_size=2000)
+
+    for order_id, lines in groupby(rows, key=lambda row: row[0]):
+        lines = list(lines)
+        _, order_number, first_name, last_name, username, address = lines[0][:6]
+        yield {
+            'order_id': order_id,
+            'order_number': order_number,
+            'customer_name': f"{first_name} {last_name}".strip() or username,
+            'delivery_address': address,
+            'items': [
+                {'product_name': name, 'unit': unit, 'quantity': quantity}
+                for *_, name, unit, quantity in lines
+            ],
+        }
+
+def manifest_csv_rows(delivery_date, statuses=PACKING_STATUSES, per_order=False):
+    """Yield CSV lines for the product manifest or the per-order packing lists"""
+    writer = csv.writer(Echo())
+    if per_order:
+        yield writer.writerow(['Order', 'Customer', 'Delivery address', 'Product', 'Quantity', 'Unit'])
+        for packing_list in packing_lists(delivery_date, statuses):
+            for item in packing_list['items']:
+                yield writer.writerow([
+                    packing_list['order_number'], packing_list['customer_name'],
+                    packing_list['delivery_address'], item['product_name'],
+                    item['quantity'], item['unit'],
+                ])
+    else:
+        yield writer.writerow(['Product', 'Total quantity', 'Unit', 'Orders'])
+        for row in picking_manifest(delivery_date, statuses):
+            yield writer.writerow([
+                row['product__name'], row['total_quantity'], row['product__unit'], row['order_count'],
+            ])
+
+def manifest_pdf(delivery_date, statuses=PACKING_STATUSES, per_order=False):
+    """Render the product manifest, followed by one page per order if requested"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    styles = getSampleStyleSheet()
+    story = [Paragraph(f"Picking manifest - {delivery_date}", styles['Heading1']), Spacer(1, 12)]
+
+    manifest_data = [['Product', 'Total quantity', 'Unit', 'Orders']]
+    for row in picking_manifest(delivery_date, statuses):
+        manifest_data.append([
+            row['product__name'], row['total_quantity'], row['product__unit'], row['order_count'],
+        ])
+    manifest_table = Table(manifest_data, colWidths=[3*inch, 1.3*inch, 1*inch, 1*inch], repeatRows=1)
+    manifest_table.setStyle(MANIFEST_TABLE_STYLE)
+    story.append(manifest_table)
+
+    if per_order:
+        for packing_list in packing_lists(delivery_date, statuses):
+            story.append(PageBreak())
+            story.append(Paragraph(f"Order {packing_list['order_number']}", styles['Heading2']))
+            # Paragraph parses markup; names and addresses are free text from customers
+            address = '<br/>'.join(escape(line) for line in packing_list['delivery_address'].splitlines())
+            story.append(Paragraph(escape(packing_list['customer_name']), styles['Normal']))
+            story.append(Paragraph(address, styles['Normal']))
+            story.append(Spacer(1, 12))
+            items_data = [['Product', 'Quantity', 'Unit']]
+            items_data.extend(
+                [item['product_name'], item['quantity'], item['unit']]
+                for item in packing_list['items']
+            )
+            items_table = Table(items_data, colWidths=[3.5*inch, 1.3*inch, 1*inch], repeatRows=1)
+            items_table.setStyle(MANIFEST_TABLE_STYLE)
+            story.append(items_table)
+
+    doc.build(story)
+    return buffer.getvalue()
@@ -1,7 +1,48 @@
-from django.db import models
+from collections import Counter, defaultdict
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Prefetch, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Concat, Trim
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.core.validators import MinValueValidator
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
+
+TAX_RATE = Decimal('0.10')  # 10% tax
+CENT = Decimal('0.01')
+
+class OrderQuerySet(models.QuerySet):
+    def recalculate_totals(self):
+        """Rebuild subtotal/tax/total for every order in the queryset with one UPDATE"""
+        item_totals = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+            line_sum=Sum('total_price')
+        ).values('line_sum')
+        subtotal = Coalesce(
+            Subquery(item_totals),
+            Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+        return self._set_subtotal(subtotal)
+    
+    def for_listing(self):
+        """Everything the order list renders, in two queries however long the page"""
+        return self.annotate(
+            customer_full_name=Trim(Concat('customer__first_name', Value(' '), 'customer__last_name')),
+            customer_email_address=F('customer__email'),
+        ).prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.order_by('id'))
+        )
+    
+    def add_to_subtotal(self, delta):
+        """Shift totals of the selected orders by a fixed amount, race-free"""
+        return self._set_subtotal(F('subtotal') + delta)
+    
+    def _set_subtotal(self, subtotal):
+        return self.update(
+            subtotal=subtotal,
+            tax=subtotal * TAX_RATE,
+            total=subtotal * (1 + TAX_RATE),
+            updated_at=timezone.now(),
+        )
 
 class Order(models.Model):
     """Customer orders"""
@@ -12,6 +53,14 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     )
     
+    # Status changes allowed by bulk transitions
+    ALLOWED_TRANSITIONS = {
+        'new': ('in_process', 'cancelled'),
+        'in_process': ('completed', 'cancelled'),
+        'completed': (),
+        'cancelled': (),
+    }
+    
     customer = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='orders')
     order_number = models.CharField(max_length=20, unique=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new')
@@ -24,51 +73,371 @@ class Order(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Keyset pagination on (created_at, id), alone and behind each list filter
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+            models.Index(fields=['customer', 'created_at', 'id'], name='order_customer_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+            models.Index(fields=['delivery_date', 'created_at', 'id'], name='order_delivery_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_number} - {self.customer.username}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can move the order between rollup buckets
+        instance._saved_status = instance.__dict__.get('status')
+        return instance
+    
+    @property
+    def sales_date(self):
+        """Day this order counts towards in the sales rollup"""
+        return timezone.localdate(self.created_at)
+    
+    def set_totals(self, subtotal):
+        """Derive tax and total from a subtotal (in memory only, rounded like the database)"""
+        self.subtotal = subtotal
+        tax = self.subtotal * TAX_RATE
+        self.tax = tax.quantize(CENT, rounding=ROUND_HALF_UP)
+        self.total = (self.subtotal + tax).quantize(CENT, rounding=ROUND_HALF_UP)
+    
     def calculate_totals(self):
-        """Calculate order totals"""
-        self.subtotal = sum(item.total_price for item in self.items.all())
-        self.tax = self.subtotal * Decimal('0.10')  # 10% tax
-        self.total = self.subtotal + self.tax
-        self.save()
+        """Recompute order totals from all items; used after bulk inserts and for repairs"""
+        subtotal = self.items.aggregate(line_sum=Sum('total_price'))['line_sum']
+        self.set_totals(subtotal or Decimal('0.00'))
+        self.save(update_fields=['subtotal', 'tax', 'total', 'updated_at'])
+    
+    def apply_line_delta(self, delta, lines=0):
+        """Shift order totals by the change in one line's price without re-reading items"""
+        if not delta and not lines:
+            return
+        old_total = Decimal(str(self.total))
+        Order.objects.filter(pk=self.pk).add_to_subtotal(delta)
+        self.set_totals(Decimal(str(self.subtotal)) + delta)
+        DailySales.record(self.sales_date, self.status, revenue=self.total - old_total, items=lines)
     
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         if not self.order_number:
-            # Generate unique order number
-            import random
-            import string
-            self.order_number = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+            # Allocate unique order number
+            from .numbering import order_numbers
+            self.order_number = order_numbers.allocate()
         super().save(*args, **kwargs)
+        
+        # Keep the daily sales rollup in step
+        update_fields = kwargs.get('update_fields')
+        previous_status = getattr(self, '_saved_status', None)
+        if adding:
+            DailySales.record(self.sales_date, self.status, revenue=self.total, orders=1)
+        elif previous_status and previous_status != self.status and (
+                update_fields is None or 'status' in update_fields):
+            DailySales.move_order(self, previous_status)
+            ProductDailySales.move_orders(
+                [{'id': self.pk, 'status': previous_status, 'created_at': self.created_at}], self.status
+            )
+        self._saved_status = self.status
+    
+    def delete(self, *args, **kwargs):
+        line_count = self.items.count()
+        status = getattr(self, '_saved_status', None) or self.status
+        sales = ProductDailySales.order_buckets([{'id': self.pk, 'status': status, 'created_at': self.created_at}])
+        result = super().delete(*args, **kwargs)
+        DailySales.record(self.sales_date, status, revenue=-Decimal(str(self.total)),
+                          orders=-1, items=-line_count)
+        ProductDailySales.record_many(sales, sign=-1)
+        return result
+
+class OrderItemManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Insert items in one batch, then recompute each affected order once"""
+        objs = list(objs)
+        for obj in objs:
+            obj.total_price = obj.quantity * obj.price_per_unit
+            obj.fill_product_snapshot()
+        created = super().bulk_create(objs, *args, **kwargs)
+        added = Counter(obj.order_id for obj in objs)
+        orders = {obj.order_id: obj.order for obj in objs}
+        for order in orders.values():
+            old_total = Decimal(str(order.total))
+            order.calculate_totals()
+            DailySales.record(order.sales_date, order.status,
+                              revenue=order.total - old_total, items=added[order.pk])
+        sales = defaultdict(ProductDailySales.empty_bucket)
+        for obj in objs:
+            ProductDailySales.add_line(sales, obj.order, obj.product_id, obj.quantity, obj.total_price)
+        ProductDailySales.record_many(sales)
+        return created
 
 class OrderItem(models.Model):
     """Items within an order"""
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey('products.Product', on_delete=models.CASCADE)
+    # Product details as sold, so reading an order never needs the product row
+    product_name = models.CharField(max_length=200, blank=True)
+    product_unit = models.CharField(max_length=50, blank=True)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     price_per_unit = models.DecimalField(max_digits=8, decimal_places=2)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     
+    objects = OrderItemManager()
+    
+    def fill_product_snapshot(self):
+        if not self.product_name:
+            self.product_name = self.product.name
+            self.product_unit = self.product.unit
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this line contributed to its order when it was loaded
+        instance._saved_line = (instance.__dict__.get('order_id'), instance.__dict__.get('total_price'))
+        # ...and to its product's sales rollup
+        instance._saved_sale = (instance.__dict__.get('product_id'), instance.__dict__.get('quantity'))
+        return instance
+    
+    def _stored_line(self):
+        saved = getattr(self, '_saved_line', (None, None))
+        if None in saved:
+            saved = OrderItem.objects.filter(pk=self.pk).values_list('order_id', 'total_price').first()
+        return saved
+    
+    def _stored_sale(self):
+        saved = getattr(self, '_saved_sale', (None, None))
+        if None in saved:
+            saved = OrderItem.objects.filter(pk=self.pk).values_list('product_id', 'quantity').first()
+        return saved
+    
     def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.price_per_unit
+        self.fill_product_snapshot()
+        previous = None if self._state.adding else self._stored_line()
+        previous_sale = None if self._state.adding else self._stored_sale()
         super().save(*args, **kwargs)
-        # Update order totals
-        self.order.calculate_totals()
+        
+        # Update order totals and the product rollup by this line's delta
+        sales = defaultdict(ProductDailySales.empty_bucket)
+        if previous:
+            old_order = self.order if previous[0] == self.order_id else Order.objects.get(pk=previous[0])
+            ProductDailySales.add_line(sales, old_order, previous_sale[0], -previous_sale[1], -previous[1], lines=-1)
+        ProductDailySales.add_line(sales, self.order, self.product_id, self.quantity, self.total_price)
+        
+        if previous and previous[0] != self.order_id:
+            # Line moved to another order: take it off the old one entirely
+            old_order.apply_line_delta(-previous[1], lines=-1)
+            previous = None
+        if previous:
+            self.order.apply_line_delta(self.total_price - previous[1])
+        else:
+            self.order.apply_line_delta(self.total_price, lines=1)
+        ProductDailySales.record_many(sales)
+        self._saved_line = (self.order_id, self.total_price)
+        self._saved_sale = (self.product_id, self.quantity)
+    
+    def delete(self, *args, **kwargs):
+        previous = self._stored_line()
+        previous_sale = self._stored_sale()
+        result = super().delete(*args, **kwargs)
+        if previous:
+            order = self.order if previous[0] == self.order_id else Order.objects.get(pk=previous[0])
+            order.apply_line_delta(-previous[1], lines=-1)
+            sales = defaultdict(ProductDailySales.empty_bucket)
+            ProductDailySales.add_line(sales, order, previous_sale[0], previous_sale[1], previous[1])
+            ProductDailySales.record_many(sales, sign=-1)
+        return result
     
     def __str__(self):
-        return f"{self.product.name} x {self.quantity}"
+        return f"{self.product_name} x {self.quantity}"
+
+class DailySales(models.Model):
+    """Sales pre-aggregated per day and order status, kept current by the order write paths"""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    order_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)  # order lines
+    
+    class Meta:
+        unique_together = ('date', 'status')
+        ordering = ['date', 'status']
+        verbose_name_plural = "Daily sales"
+    
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count} orders, ${self.revenue}"
+    
+    @classmethod
+    def record(cls, date, status, revenue=0, orders=0, items=0):
+        """Add deltas to one (date, status) bucket, creating it on first use"""
+        revenue = Decimal(str(revenue))
+        if not (revenue or orders or items):
+            return
+        changes = {
+            'revenue': F('revenue') + revenue,
+            'order_count': F('order_count') + orders,
+            'item_count': F('item_count') + items,
+        }
+        if cls.objects.filter(date=date, status=status).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(date=date, status=status, revenue=revenue,
+                                   order_count=orders, item_count=items)
+        except IntegrityError:
+            # Another worker created the bucket first
+            cls.objects.filter(date=date, status=status).update(**changes)
+    
+    @classmethod
+    def move_order(cls, order, old_status, line_count=None):
+        """Move one order's contribution from its old status bucket to its current one"""
+        if line_count is None:
+            line_count = order.items.count()
+        cls.record(order.sales_date, old_status, revenue=-Decimal(str(order.total)),
+                   orders=-1, items=-line_count)
+        cls.record(order.sales_date, order.status, revenue=order.total,
+                   orders=1, items=line_count)
+    
+    @classmethod
+    def move_orders(cls, rows, new_status, line_counts):
+        """Move many orders at once; ``rows`` are dicts with id, status, created_at and total"""
+        buckets = defaultdict(lambda: [Decimal('0.00'), 0, 0])
+        for row in rows:
+            day = timezone.localdate(row['created_at'])
+            lines = line_counts.get(row['id'], 0)
+            for status, sign in ((row['status'], -1), (new_status, 1)):
+                bucket = buckets[(day, status)]
+                bucket[0] += sign * row['total']
+                bucket[1] += sign
+                bucket[2] += sign * lines
+        for (day, status), (revenue, orders, items) in buckets.items():
+            cls.record(day, status, revenue=revenue, orders=orders, items=items)
+
+class ProductDailySales(models.Model):
+    """Units and line revenue (before tax) per product, day and order status, kept current like DailySales"""
+    date = models.DateField()
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='daily_sales')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    line_count = models.IntegerField(default=0)
+    
+    # Upserts per statement; each bucket adds one WHEN to every CASE
+    BATCH_SIZE = 500
+    
+    class Meta:
+        # The unique index leads with date, so window reports are range scans
+        unique_together = ('date', 'product', 'status')
+        indexes = [
+            models.Index(fields=['product', 'date'], name='product_sales_product_idx'),
+        ]
+        ordering = ['date', 'product']
+        verbose_name_plural = "Product daily sales"
+    
+    def __str__(self):
+        return f"{self.date} product {self.product_id} {self.status}: {self.units} units, ${self.revenue}"
+    
+    @staticmethod
+    def empty_bucket():
+        return [0, Decimal('0.00'), 0]
+    
+    @staticmethod
+    def add_line(buckets, order, product_id, units, revenue, lines=1):
+        """Add one order line to a {(date, product_id, status): [units, revenue, lines]} dict"""
+        bucket = buckets[(order.sales_date, product_id, order.status)]
+        bucket[0] += units
+        bucket[1] += Decimal(str(revenue))
+        bucket[2] += lines
+    
+    @classmethod
+    def record_many(cls, buckets, sign=1):
+        """Add bucket deltas with two statements per batch, however many buckets change"""
+        changed = [
+            (key, [sign * value for value in values])
+            for key, values in buckets.items() if any(values)
+        ]
+        for offset in range(0, len(changed), cls.BATCH_SIZE):
+            batch = changed[offset:offset + cls.BATCH_SIZE]
+            # Make sure every bucket exists; concurrent creators are ignored, not raced
+            cls.objects.bulk_create([
+                cls(date=day, product_id=product_id, status=status) for (day, product_id, status), _ in batch
+            ], ignore_conflicts=True)
+            matches = Q()
+            whens = {'units': [], 'revenue': [], 'line_count': []}
+            for (day, product_id, status), (units, revenue, lines) in batch:
+                match = Q(date=day, product_id=product_id, status=status)
+                matches |= match
+                whens['units'].append(When(match, then=Value(units)))
+                whens['revenue'].append(When(match, then=Value(revenue)))
+                whens['line_count'].append(When(match, then=Value(lines)))
+            cls.objects.filter(matches).update(
+                units=F('units') + Case(*whens['units'], output_field=models.IntegerField()),
+                revenue=F('revenue') + Case(
+                    *whens['revenue'], output_field=models.DecimalField(max_digits=14, decimal_places=2)
+                ),
+                line_count=F('line_count') + Case(*whens['line_count'], output_field=models.IntegerField()),
+            )
+    
+    @classmethod
+    def order_buckets(cls, rows):
+        """What whole orders contribute; ``rows`` are dicts with id, status and created_at"""
+        orders = {row['id']: row for row in rows}
+        buckets = defaultdict(cls.empty_bucket)
+        lines = OrderItem.objects.filter(order_id__in=list(orders)).order_by().values(
+            'order_id', 'product_id'
+        ).annotate(units=Sum('quantity'), revenue=Sum('total_price'), lines=Count('id'))
+        for line in lines:
+            row = orders[line['order_id']]
+            bucket = buckets[(timezone.localdate(row['created_at']), line['product_id'], row['status'])]
+            bucket[0] += line['units']
+            bucket[1] += line['revenue']
+            bucket[2] += line['lines']
+        return buckets
+    
+    @classmethod
+    def move_orders(cls, rows, new_status):
+        """Move whole orders between status buckets, e.g. when they are cancelled"""
+        buckets = defaultdict(cls.empty_bucket)
+        for (day, product_id, status), (units, revenue, lines) in cls.order_buckets(rows).items():
+            for target, sign in ((status, -1), (new_status, 1)):
+                bucket = buckets[(day, product_id, target)]
+                bucket[0] += sign * units
+                bucket[1] += sign * revenue
+                bucket[2] += sign * lines
+        cls.record_many(buckets)
+
+class NumberSequence(models.Model):
+    """Per-day counter from which order/invoice number blocks are leased"""
+    key = models.CharField(max_length=30)
+    date = models.DateField()
+    last_value = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('key', 'date')
+    
+    def __str__(self):
+        return f"{self.key} {self.date}: {self.last_value}"
 
 class Invoice(models.Model):
     """Invoice for orders"""
+    RENDER_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+    
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='invoice')
     invoice_number = models.CharField(max_length=20, unique=True)
     issue_date = models.DateTimeField(default=timezone.now)
     due_date = models.DateField()
     pdf_file = models.FileField(upload_to='invoices/', blank=True, null=True)
+    # sha256 of everything printed on the PDF; pdf_file is current when render_status is ready
+    fingerprint = models.CharField(max_length=64, blank=True)
+    render_status = models.CharField(max_length=10, choices=RENDER_STATUS_CHOICES, default='pending')
+    rendered_at = models.DateTimeField(blank=True, null=True)
     is_paid = models.BooleanField(default=False)
     payment_date = models.DateTimeField(blank=True, null=True)
     
@@ -77,10 +446,9 @@ class Invoice(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.invoice_number:
-            # Generate unique invoice number
-            import random
-            import string
-            self.invoice_number = 'INV-' + ''.join(random.choices(string.digits, k=6))
+            # Allocate unique invoice number
+            from .numbering import invoice_numbers
+            self.invoice_number = invoice_numbers.allocate()
         
         if not self.due_date:
             self.due_date = (self.issue_date + timezone.timedelta(days=30)).date()
@@ -96,13 +464,24 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.customer.username}"
     
+    @cached_property
+    def summary(self):
+        """Item count and price of the cart in one aggregate query"""
+        return self.items.aggregate(
+            total_items=Coalesce(Sum('quantity'), 0),
+            total_price=Coalesce(
+                Sum(F('quantity') * F('product__price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0.00')),
+            ),
+        )
+    
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.summary['total_items']
     
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.summary['total_price']
 
 class CartItem(models.Model):
     """Items in shopping cart"""
@@ -120,3 +499,21 @@ class CartItem(models.Model):
     
     def __str__(self):
         return f"{self.product.name} x {self.quantity} in {self.cart.customer.username}'s cart"
+
+class StockReservation(models.Model):
+    """Stock held for a customer's cart line until it expires or is checked out"""
+    customer = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ('customer', 'product')
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} held until {self.expires_at:%H:%M}"
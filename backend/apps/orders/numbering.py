@@ -0,0 +1,89 @@
+import os
+import threading
+import weakref
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .models import NumberSequence
+
+_allocators = weakref.WeakSet()
+
+class NumberAllocator:
+    """Hands out unique, human-friendly numbers such as ORD-20240301-00042.
+
+    Numbers restart at 1 every day. Each process leases a block of
+    NUMBER_BLOCK_SIZE values from NumberSequence and serves them from memory,
+    so only one allocation per block touches the database. Leases run on the
+    NUMBERING_DB_ALIAS connection and commit on their own, so a block is never
+    handed out twice even if the caller's transaction rolls back (its unused
+    numbers are simply skipped). Within a process numbers grow monotonically;
+    across processes they interleave by block. A block size of 1 gives a
+    strictly gap-free, globally ordered sequence at one round trip per number.
+    """
+
+    def __init__(self, key, prefix, width=5, block_size=None):
+        self.key = key
+        self.prefix = prefix
+        self.width = width
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self.reset()
+        _allocators.add(self)
+
+    @property
+    def block_size(self):
+        return self._block_size or getattr(settings, 'NUMBER_BLOCK_SIZE', 50)
+
+    @property
+    def using(self):
+        alias = getattr(settings, 'NUMBERING_DB_ALIAS', 'default')
+        return alias if alias in connections.databases else 'default'
+
+    def reset(self):
+        """Forget any leased block (called in forked children)"""
+        self._day = None
+        self._next = 0
+        self._end = -1
+        self.leases = 0
+
+    def lease(self, day):
+        """Reserve the next block for ``day``; returns its (first, last) values"""
+        size = self.block_size
+        with transaction.atomic(using=self.using):
+            sequence, _ = NumberSequence.objects.using(self.using).select_for_update().get_or_create(
+                key=self.key, date=day
+            )
+            first = sequence.last_value + 1
+            sequence.last_value += size
+            sequence.save(using=self.using, update_fields=['last_value'])
+        self.leases += 1
+        return first, sequence.last_value
+
+    def allocate_value(self, day=None):
+        day = day or timezone.localdate()
+        with self._lock:
+            if day != self._day or self._next > self._end:
+                self._next, self._end = self.lease(day)
+                self._day = day
+            value = self._next
+            self._next += 1
+        return day, value
+
+    def format(self, day, value):
+        return f"{self.prefix}-{day:%Y%m%d}-{value:0{self.width}d}"
+
+    def allocate(self, day=None):
+        return self.format(*self.allocate_value(day))
+
+def _reset_after_fork():
+    # A block leased before fork (e.g. gunicorn --preload) must not be reused
+    # by every child, so children start without one
+    for allocator in list(_allocators):
+        allocator._lock = threading.Lock()
+        allocator.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+order_numbers = NumberAllocator('order', 'ORD')
+invoice_numbers = NumberAllocator('invoice', 'INV')
@@ -0,0 +1,91 @@
+"""Time-bounded stock holds between adding to the cart and checking out.
+
+A product's available stock is its stock_quantity minus every unexpired
+hold placed by other customers. Placing a hold and checking out both
+row-lock the products involved, so two shoppers can never be promised the
+same units. Expired holds stop counting immediately and are deleted in bulk
+by expire_reservations().
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import StockReservation
+
+class InsufficientStock(Exception):
+    """Raised with {product_id: available quantity} for every line that cannot be held"""
+
+    def __init__(self, shortages):
+        super().__init__(shortages)
+        self.shortages = shortages
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60))
+
+def with_available_stock(queryset, customer_id=None):
+    """Annotate products with ``held_quantity`` and ``available_quantity``
+
+    Holds belonging to ``customer_id`` are not subtracted, since that stock is
+    already theirs.
+    """
+    holds = StockReservation.objects.filter(
+        product=OuterRef('pk'), expires_at__gt=timezone.now()
+    )
+    if customer_id is not None:
+        holds = holds.exclude(customer_id=customer_id)
+    held = holds.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+    return queryset.annotate(
+        held_quantity=Coalesce(Subquery(held), 0, output_field=IntegerField()),
+    ).annotate(
+        available_quantity=F('stock_quantity') - F('held_quantity'),
+    )
+
+@transaction.atomic
+def hold(customer_id, quantities, replace=False):
+    """Hold stock for cart lines given as {product_id: quantity}; 0 releases a line
+
+    Existing holds of the customer on those products are replaced and their
+    expiry renewed. With ``replace`` the customer's other holds are released.
+    Raises InsufficientStock, holding nothing, if any line cannot be covered.
+    """
+    from apps.products.models import Product
+    wanted = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+
+    locked = Product.objects.select_for_update().filter(pk__in=list(wanted)).order_by('pk')
+    available = dict(with_available_stock(locked, customer_id).values_list('pk', 'available_quantity'))
+    shortages = {
+        product_id: max(available.get(product_id, 0), 0)
+        for product_id, quantity in wanted.items()
+        if available.get(product_id, 0) < quantity
+    }
+    if shortages:
+        raise InsufficientStock(shortages)
+
+    released = StockReservation.objects.filter(customer_id=customer_id)
+    if not replace:
+        released = released.filter(product_id__in=list(quantities))
+    released.exclude(product_id__in=list(wanted)).delete()
+
+    expires_at = timezone.now() + reservation_ttl()
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(customer_id=customer_id, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in wanted.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['customer', 'product'],
+        update_fields=['quantity', 'expires_at'],
+    )
+
+def release(customer_id, product_ids=None):
+    """Drop a customer's holds, on every product or only the given ones"""
+    holds = StockReservation.objects.filter(customer_id=customer_id)
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=list(product_ids))
+    return holds.delete()[0]
+
+def expire_reservations():
+    """Delete every expired hold in one statement"""
+    return StockReservation.objects.filter(expires_at__lte=timezone.now()).delete()[0]
@@ -1,16 +1,18 @@
 from rest_framework import serializers
 from .models import Order, OrderItem, Invoice, Cart, CartItem
 from apps.products.serializers import ProductSerializer
+from .checkout import place_order
+from .cart_store import priced_lines
+from .reservations import with_available_stock
+from decimal import Decimal
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """Serializer for order items"""
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    product_unit = serializers.CharField(source='product.unit', read_only=True)
     
     class Meta:
         model = OrderItem
         fields = '__all__'
-        read_only_fields = ('total_price',)
+        read_only_fields = ('total_price', 'product_name', 'product_unit')
 
 class OrderSerializer(serializers.ModelSerializer):
     """Serializer for orders"""
@@ -23,6 +25,17 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('order_number', 'subtotal', 'tax', 'total')
 
+class OrderListSerializer(serializers.ModelSerializer):
+    """Read-only order representation for lists; expects Order.objects.for_listing()"""
+    items = OrderItemSerializer(many=True, read_only=True)
+    customer_name = serializers.CharField(source='customer_full_name', read_only=True)
+    customer_email = serializers.CharField(source='customer_email_address', read_only=True)
+    
+    class Meta:
+        model = Order
+        fields = '__all__'
+        read_only_fields = [field.name for field in Order._meta.fields]
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating orders"""
     items = serializers.ListField(write_only=True)
@@ -33,54 +46,7 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(
-            customer=self.context['request'].user,
-            **validated_data
-        )
-        
-        # Create order items and update stock
-        for item_data in items_data:
-            product_id = item_data['product_id']
-            quantity = item_data['quantity']
-            
-            try:
-                from apps.products.models import Product, StockMovement
-                product = Product.objects.get(id=product_id)
-                
-                # Check stock availability
-                if product.stock_quantity < quantity:
-                    raise serializers.ValidationError(
-                        f"Not enough stock for {product.name}. Available: {product.stock_quantity}"
-                    )
-                
-                # Create order item
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price_per_unit=product.price
-                )
-                
-                # Update stock
-                old_stock = product.stock_quantity
-                product.stock_quantity -= quantity
-                product.save()
-                
-                # Track stock movement
-                StockMovement.objects.create(
-                    product=product,
-                    movement_type='out',
-                    quantity=-quantity,
-                    previous_stock=old_stock,
-                    new_stock=product.stock_quantity,
-                    reason=f'Order {order.order_number}',
-                    created_by=None
-                )
-                
-            except Product.DoesNotExist:
-                raise serializers.ValidationError(f"Product with id {product_id} not found")
-        
-        return order
+        return place_order(self.context['request'].user, items_data, **validated_data)
 
 class InvoiceSerializer(serializers.ModelSerializer):
     """Serializer for invoices"""
@@ -109,4 +75,104 @@ class CartSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Cart
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class CartLineInputSerializer(serializers.Serializer):
+    """One {product_id, quantity} entry of a batch cart update; quantity 0 removes the line"""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+class CartBatchSerializer(serializers.Serializer):
+    """Validate a batch of cart lines, checking every product in one query
+    
+    Stock is checked net of other customers' holds; pass the request in the context.
+    """
+    items = CartLineInputSerializer(many=True)
+    
+    def validate_items(self, items):
+        from apps.products.models import Product
+        request = self.context.get('request')
+        queryset = with_available_stock(
+            Product.objects.filter(pk__in=[item['product_id'] for item in items]),
+            request.user.pk if request else None,
+        )
+        products = {
+            pk: (available_quantity, availability_status)
+            for pk, available_quantity, availability_status in queryset.values_list(
+                'pk', 'available_quantity', 'availability_status'
+            )
+        }
+        
+        errors = []
+        seen = set()
+        for item in items:
+            product_id, quantity = item['product_id'], item['quantity']
+            error = {}
+            if product_id in seen:
+                error['product_id'] = ['Product is listed more than once']
+            elif product_id not in products:
+                error['product_id'] = ['Product not found']
+            elif quantity:
+                available_quantity, availability_status = products[product_id]
+                if availability_status != 'available' or available_quantity <= 0:
+                    error['product_id'] = ['Product not available']
+                elif available_quantity < quantity:
+                    error['quantity'] = [f'Not enough stock. Available: {available_quantity}']
+            seen.add(product_id)
+            errors.append(error)
+        
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+def _cart_item(product, line, cart_id, timestamp):
+    return {
+        'id': line.get('id'),
+        'product': ProductSerializer(product).data,
+        'total_price': product.line_total,
+        'quantity': product.cart_quantity,
+        'added_at': timestamp.to_representation(line['added_at']),
+        'cart': cart_id,
+    }
+
+def _cart_totals(products):
+    if not products:
+        return {'total_items': 0, 'total_price': Decimal('0.00')}
+    return {'total_items': products[0].cart_total_items, 'total_price': products[0].cart_total_price}
+
+def cart_data(state, customer_id):
+    """CartSerializer-shaped data for a cart_store snapshot, read with one query"""
+    lines = state['lines']
+    timestamp = serializers.DateTimeField()
+    # Lines whose product has been deleted simply drop out of the query
+    products = {product.pk: product for product in priced_lines(lines)}
+    
+    return {
+        'id': state['cart_id'],
+        'items': [
+            _cart_item(products[product_id], line, state['cart_id'], timestamp)
+            for product_id, line in lines.items() if product_id in products
+        ],
+        **_cart_totals(list(products.values())),
+        'customer': customer_id,
+        'created_at': timestamp.to_representation(state['created_at']),
+        'updated_at': timestamp.to_representation(state['updated_at']),
+    }
+
+def cart_delta(state, product_id, item_id=None):
+    """The changed line (None once removed) and the new cart totals"""
+    lines = state['lines']
+    timestamp = serializers.DateTimeField()
+    products = priced_lines(lines)
+    item = next(
+        (_cart_item(product, lines[product_id], state['cart_id'], timestamp)
+         for product in products if product.pk == product_id),
+        None,
+    )
+    
+    return {
+        'item_id': item['id'] if item else item_id,
+        'item': item,
+        **_cart_totals(products),
+        'updated_at': timestamp.to_representation(state['updated_at']),
+    }
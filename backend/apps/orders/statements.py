@@ -0,0 +1,114 @@
+import io
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from django.utils import timezone
+from .models import Invoice, Order, OrderItem
+from .numbering import invoice_numbers
+from .utils import invoice_context, render_invoice_bytes
+
+BATCH_SIZE = 200
+
+def statement_orders(start, end, customer_ids=None):
+    """Orders created between two dates (inclusive) that should get a statement"""
+    tz = timezone.get_current_timezone()
+    orders = Order.objects.filter(
+        created_at__gte=timezone.make_aware(datetime.combine(start, datetime.min.time()), tz),
+        created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()), tz),
+    ).exclude(status='cancelled')
+    if customer_ids:
+        orders = orders.filter(customer_id__in=customer_ids)
+    return orders.order_by('customer_id', 'created_at', 'id')
+
+def ensure_invoices(order_ids):
+    """Create missing invoices for a batch of orders with one INSERT"""
+    existing = set(Invoice.objects.filter(order_id__in=order_ids).values_list('order_id', flat=True))
+    now = timezone.now()
+    Invoice.objects.bulk_create([
+        Invoice(
+            order_id=order_id,
+            invoice_number=invoice_numbers.allocate(),
+            issue_date=now,
+            due_date=(now + timedelta(days=30)).date(),
+        )
+        for order_id in order_ids if order_id not in existing
+    ], ignore_conflicts=True)
+
+def statement_contexts(orders):
+    """Yield invoice_context() data for every order, loading each batch in three queries"""
+    order_ids = list(orders.values_list('id', flat=True))
+    for offset in range(0, len(order_ids), BATCH_SIZE):
+        batch = order_ids[offset:offset + BATCH_SIZE]
+        ensure_invoices(batch)
+
+        items = defaultdict(list)
+        rows = OrderItem.objects.filter(order_id__in=batch).order_by('order_id', 'id').values_list(
+            'order_id', 'product_name', 'product_unit', 'quantity', 'price_per_unit', 'total_price'
+        )
+        for order_id, *line in rows:
+            items[order_id].append(line)
+
+        invoices = Invoice.objects.filter(order_id__in=batch).select_related('order__customer')
+        by_order = {invoice.order_id: invoice for invoice in invoices}
+        for order_id in batch:
+            yield invoice_context(by_order[order_id], items[order_id])
+
+def _batches(iterable, size=BATCH_SIZE):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def render_statements(contexts, workers=None, progress=None):
+    """Render PDFs across a process pool, yielding (filename, pdf bytes) in order
+
+    Workers receive plain data and never touch the database; work is fed one
+    batch at a time so memory stays bounded however long the run.
+    ``progress(done, elapsed)`` is called after every PDF.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    done = 0
+    # spawn: workers import only the PDF code and inherit no database sockets
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for batch in _batches(contexts):
+            for result in pool.map(render_invoice_bytes, batch, chunksize=8):
+                done += 1
+                if progress:
+                    progress(done, time.perf_counter() - started)
+                yield result
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink that lets zipfile produce an archive chunk by chunk"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_statement_zip(orders, workers=None, progress=None):
+    """Yield a ZIP archive of every order's invoice PDF as it is rendered"""
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, pdf in render_statements(statement_contexts(orders), workers, progress):
+            archive.writestr(filename, pdf)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from .models import DailySales, Order, OrderItem, ProductDailySales
+from apps.notifications.utils import queue_status_notifications
+
+def allowed_sources(target):
+    """Statuses an order may be moved to ``target`` from"""
+    return [source for source, targets in Order.ALLOWED_TRANSITIONS.items() if target in targets]
+
+@transaction.atomic
+def bulk_transition(orders, target):
+    """Move every order in ``orders`` to ``target`` with one UPDATE.
+
+    Rows are locked while they are classified, so the UPDATE applies exactly
+    to the orders reported as updated. Customers are notified in one batch
+    after commit. Returns one result dict per order.
+    """
+    sources = allowed_sources(target)
+    rows = list(
+        orders.select_for_update().order_by('id').values('id', 'status', 'created_at', 'total')
+    )
+
+    results = []
+    movable = []
+    for row in rows:
+        if row['status'] == target:
+            results.append({'id': row['id'], 'result': 'unchanged', 'status': target})
+        elif row['status'] in sources:
+            movable.append(row)
+            results.append({'id': row['id'], 'result': 'updated', 'from': row['status'], 'status': target})
+        else:
+            results.append({
+                'id': row['id'],
+                'result': 'invalid_transition',
+                'status': row['status'],
+                'error': f"Cannot change status from {row['status']} to {target}",
+            })
+
+    if movable:
+        ids = [row['id'] for row in movable]
+        Order.objects.filter(id__in=ids, status__in=sources).update(
+            status=target,
+            updated_at=timezone.now(),
+        )
+        line_counts = dict(
+            OrderItem.objects.filter(order_id__in=ids).values('order_id').annotate(
+                lines=Count('id')
+            ).values_list('order_id', 'lines')
+        )
+        DailySales.move_orders(movable, target, line_counts)
+        ProductDailySales.move_orders(movable, target)
+        queue_status_notifications(ids)
+
+    return results
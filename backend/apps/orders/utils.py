@@ -4,86 +4,231 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from celery import shared_task
+from functools import lru_cache
+import hashlib
+import io
+import json
+import logging
 import os
 
-def generate_invoice_pdf(invoice):
-    """Generate PDF invoice"""
-    # Create invoices directory if it doesn't exist
-    invoice_dir = os.path.join(settings.MEDIA_ROOT, 'invoices')
-    os.makedirs(invoice_dir, exist_ok=True)
-    
-    filename = f"invoice_{invoice.invoice_number}.pdf"
-    filepath = os.path.join(invoice_dir, filename)
-    
-    # Create PDF document
-    doc = SimpleDocTemplate(filepath, pagesize=letter)
-    story = []
+logger = logging.getLogger(__name__)
+
+# Bump when the PDF layout changes so every cached invoice is re-rendered
+INVOICE_LAYOUT_VERSION = 1
+
+INVOICE_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+])
+
+ITEMS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTNAME', (0, -3), (-1, -1), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgreen),
+])
+
+@lru_cache(maxsize=None)
+def invoice_title_style():
+    """Build the title style once per process instead of once per PDF"""
     styles = getSampleStyleSheet()
-    
-    # Title
-    title_style = ParagraphStyle(
+    return ParagraphStyle(
         'CustomTitle',
         parent=styles['Heading1'],
         fontSize=24,
         spaceAfter=30,
         textColor=colors.darkgreen
     )
-    story.append(Paragraph("FRESH PRODUCE INVOICE", title_style))
-    story.append(Spacer(1, 20))
+
+ITEMS_TABLE_WIDTHS = [3*inch, 1.5*inch, 1.5*inch, 1.5*inch]
+INVOICE_TABLE_WIDTHS = [2*inch, 3*inch]
+
+def invoice_context(invoice, items=None):
+    """Everything printed on an invoice, as plain picklable data
     
+    ``items`` may be passed pre-fetched as (name, unit, quantity, price, total)
+    rows; otherwise they are read with one query.
+    """
+    order = invoice.order
+    if items is None:
+        items = order.items.order_by('id').values_list(
+            'product_name', 'product_unit', 'quantity', 'price_per_unit', 'total_price'
+        )
+    return {
+        'invoice_number': invoice.invoice_number,
+        'order_number': order.order_number,
+        'issue_date': invoice.issue_date.strftime('%Y-%m-%d'),
+        'due_date': invoice.due_date.strftime('%Y-%m-%d'),
+        'customer_name': order.customer.get_full_name(),
+        'customer_email': order.customer.email,
+        'items': [[name, unit, quantity, str(price), str(total)]
+                  for name, unit, quantity, price, total in items],
+        'subtotal': str(order.subtotal),
+        'tax': str(order.tax),
+        'total': str(order.total),
+    }
+
+def context_fingerprint(context):
+    return hashlib.sha256(
+        json.dumps([INVOICE_LAYOUT_VERSION, context], sort_keys=True).encode()
+    ).hexdigest()
+
+def invoice_fingerprint(invoice):
+    """Hash everything printed on the invoice PDF"""
+    return context_fingerprint(invoice_context(invoice))
+
+def invoice_pdf_name(invoice, fingerprint):
+    return f"invoice_{invoice.invoice_number}_{fingerprint[:16]}.pdf"
+
+def build_invoice_pdf(context, output):
+    """Render an invoice from invoice_context() data to a path or file object"""
+    doc = SimpleDocTemplate(output, pagesize=letter)
+    story = []
+
+    # Title
+    story.append(Paragraph("FRESH PRODUCE INVOICE", invoice_title_style()))
+    story.append(Spacer(1, 20))
+
     # Invoice details
     invoice_data = [
-        ['Invoice Number:', invoice.invoice_number],
-        ['Order Number:', invoice.order.order_number],
-        ['Issue Date:', invoice.issue_date.strftime('%Y-%m-%d')],
-        ['Due Date:', invoice.due_date.strftime('%Y-%m-%d')],
-        ['Customer:', invoice.order.customer.get_full_name()],
-        ['Email:', invoice.order.customer.email],
+        ['Invoice Number:', context['invoice_number']],
+        ['Order Number:', context['order_number']],
+        ['Issue Date:', context['issue_date']],
+        ['Due Date:', context['due_date']],
+        ['Customer:', context['customer_name']],
+        ['Email:', context['customer_email']],
     ]
-    
-    invoice_table = Table(invoice_data, colWidths=[2*inch, 3*inch])
-    invoice_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-    ]))
+
+    invoice_table = Table(invoice_data, colWidths=INVOICE_TABLE_WIDTHS)
+    invoice_table.setStyle(INVOICE_TABLE_STYLE)
     story.append(invoice_table)
     story.append(Spacer(1, 30))
-    
+
     # Order items
     items_data = [['Product', 'Quantity', 'Unit Price', 'Total']]
-    for item in invoice.order.items.all():
+    for name, unit, quantity, price, total in context['items']:
         items_data.append([
-            item.product.name,
-            f"{item.quantity} {item.product.unit}",
-            f"${item.price_per_unit}",
-            f"${item.total_price}"
+            name,
+            f"{quantity} {unit}",
+            f"${price}",
+            f"${total}"
         ])
-    
+
     # Add totals
     items_data.extend([
-        ['', '', 'Subtotal:', f"${invoice.order.subtotal}"],
-        ['', '', 'Tax:', f"${invoice.order.tax}"],
-        ['', '', 'TOTAL:', f"${invoice.order.total}"],
+        ['', '', 'Subtotal:', f"${context['subtotal']}"],
+        ['', '', 'Tax:', f"${context['tax']}"],
+        ['', '', 'TOTAL:', f"${context['total']}"],
     ])
-    
-    items_table = Table(items_data, colWidths=[3*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, -3), (-1, -1), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgreen),
-    ]))
+
+    items_table = Table(items_data, colWidths=ITEMS_TABLE_WIDTHS)
+    items_table.setStyle(ITEMS_TABLE_STYLE)
     story.append(items_table)
-    
+
     # Build PDF
     doc.build(story)
-    
-    return f"invoices/{filename}"
\ No newline at end of file
+
+def render_invoice_bytes(context):
+    """Render one invoice in memory; safe to run in a worker process without Django"""
+    buffer = io.BytesIO()
+    build_invoice_pdf(context, buffer)
+    return f"invoice_{context['invoice_number']}.pdf", buffer.getvalue()
+
+def generate_invoice_pdf(invoice, filename=None, context=None):
+    """Generate PDF invoice"""
+    # Create invoices directory if it doesn't exist
+    invoice_dir = os.path.join(settings.MEDIA_ROOT, 'invoices')
+    os.makedirs(invoice_dir, exist_ok=True)
+
+    filename = filename or f"invoice_{invoice.invoice_number}.pdf"
+    filepath = os.path.join(invoice_dir, filename)
+
+    build_invoice_pdf(context or invoice_context(invoice), filepath)
+
+    return f"invoices/{filename}"
+
+def _mark_rendered(invoice, fingerprint, path):
+    """Point the invoice at a finished render, unless the order changed meanwhile"""
+    from .models import Invoice
+    old_path = invoice.pdf_file.name if invoice.pdf_file else None
+    updated = Invoice.objects.filter(pk=invoice.pk, fingerprint=fingerprint).update(
+        pdf_file=path,
+        render_status='ready',
+        rendered_at=timezone.now(),
+    )
+    if updated and old_path and old_path != path:
+        invoice.pdf_file.storage.delete(old_path)
+    return bool(updated)
+
+def request_invoice_render(invoice):
+    """Make sure the invoice PDF matches its order, queueing a background render if not.
+
+    Returns True when the stored PDF is already current.
+    """
+    from .models import Invoice
+    fingerprint = invoice_fingerprint(invoice)
+    if invoice.fingerprint == fingerprint and invoice.render_status == 'ready':
+        return True
+
+    # Only one render is queued per fingerprint; a failed one may be retried
+    queued = Invoice.objects.filter(pk=invoice.pk).exclude(
+        fingerprint=fingerprint, render_status='pending'
+    ).update(fingerprint=fingerprint, render_status='pending')
+    if queued:
+        transaction.on_commit(lambda: render_invoice_task.delay(invoice.pk, fingerprint))
+    invoice.fingerprint = fingerprint
+    invoice.render_status = 'pending'
+    return False
+
+@shared_task
+def render_invoice_task(invoice_id, fingerprint):
+    """Render an invoice PDF in the background if its order is still unchanged"""
+    from .models import Invoice
+    try:
+        invoice = Invoice.objects.select_related('order__customer').get(pk=invoice_id)
+    except Invoice.DoesNotExist:
+        return False
+
+    context = invoice_context(invoice)
+    if context_fingerprint(context) != fingerprint:
+        # The order changed after this render was queued; render the current content instead
+        request_invoice_render(invoice)
+        return False
+
+    try:
+        path = generate_invoice_pdf(invoice, invoice_pdf_name(invoice, fingerprint), context)
+    except Exception as e:
+        logger.error(f"Failed to render invoice {invoice.invoice_number}: {str(e)}")
+        Invoice.objects.filter(pk=invoice_id, fingerprint=fingerprint).update(render_status='failed')
+        return False
+
+    return _mark_rendered(invoice, fingerprint, path)
+
+@shared_task
+def flush_carts_task():
+    """Write carts changed in the cache back to the database"""
+    from .cart_store import cart_store
+    return cart_store.flush_dirty()
+
+@shared_task
+def sweep_carts_task():
+    """Flush pending carts and delete abandoned ones"""
+    from .cart_store import cart_store
+    return cart_store.sweep()
+
+@shared_task
+def expire_reservations_task():
+    """Delete stock holds past their expiry"""
+    from .reservations import expire_reservations
+    return expire_reservations()
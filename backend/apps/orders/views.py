@@ -1,39 +1,93 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
 from django.db.models import Sum, Count, Q
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import datetime, timedelta
-from .models import Order, OrderItem, Invoice, Cart, CartItem
-from .serializers import (OrderSerializer, OrderCreateSerializer, InvoiceSerializer,
-                         CartSerializer, CartItemSerializer)
+from .models import Order, OrderItem, Invoice
+from .serializers import (OrderSerializer, OrderListSerializer, OrderCreateSerializer,
+                         InvoiceSerializer, CartBatchSerializer, cart_data, cart_delta)
+from .cart_store import CartBusy, cart_store
+from .reservations import InsufficientStock, hold, release
+from .pagination import KeysetPagination
+from .analytics import BUCKETS, dashboard, parse_date_range
+from .utils import request_invoice_render
+from .statements import statement_orders, stream_statement_zip
+from .transitions import bulk_transition
+from .exports import export_orders, streaming_export
+from .manifest import (PACKING_STATUSES, manifest_csv_rows, manifest_pdf,
+                       packing_lists, picking_manifest)
 from apps.accounts.views import AdminOnlyPermission
 from apps.notifications.utils import send_order_notification
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keys filter_orders() understands
+ORDER_FILTERS = ('status', 'delivery_date', 'customer')
+
+def filter_orders(queryset, params, is_admin=False):
+    """Apply status, delivery_date and (admins only) customer filters"""
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    
+    if params.get('delivery_date'):
+        try:
+            delivery_date = parse_date(str(params['delivery_date']))
+        except ValueError:
+            delivery_date = None
+        if delivery_date is None:
+            raise ValidationError({'delivery_date': 'Use YYYY-MM-DD format'})
+        queryset = queryset.filter(delivery_date=delivery_date)
+    
+    if params.get('customer') and is_admin:
+        try:
+            queryset = queryset.filter(customer_id=int(params['customer']))
+        except (TypeError, ValueError):
+            raise ValidationError({'customer': 'Must be a customer id'})
+    
+    return queryset
 
 class OrderListCreateView(generics.ListCreateAPIView):
     """List orders or create new order"""
     
+    @property
+    def pagination_class(self):
+        # ?pagination=cursor (or a ?cursor= link) switches to keyset pages
+        params = self.request.query_params
+        if params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params:
+            return KeysetPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
+    
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return OrderCreateSerializer
-        return OrderSerializer
+        return OrderListSerializer
     
     def get_queryset(self):
         user = self.request.user
         if user.user_type == 'admin':
-            return Order.objects.select_related('customer').prefetch_related('items').all()
+            queryset = Order.objects.for_listing()
         else:
-            return Order.objects.filter(customer=user).prefetch_related('items')
+            queryset = Order.objects.filter(customer=user).for_listing()
+        return filter_orders(queryset, self.request.query_params, user.user_type == 'admin')
     
     def perform_create(self, serializer):
+        # Write the cart through first so it survives a failed checkout
+        cart_store.flush(self.request.user.pk)
         order = serializer.save()
         
-        # Clear customer's cart after successful order
+        # Clear customer's cart after successful order, releasing holds on lines not ordered
         try:
-            cart = Cart.objects.get(customer=self.request.user)
-            cart.items.all().delete()
-        except Cart.DoesNotExist:
+            cart_store.clear(self.request.user.pk)
+        except CartBusy:
+            # The order stands; a concurrent cart change keeps its lines
             pass
+        release(self.request.user.pk)
         
         # Send notifications
         send_order_notification(order, 'new_order')
@@ -44,10 +98,11 @@ class OrderDetailView(generics.RetrieveUpdateAPIView):
     
     def get_queryset(self):
         user = self.request.user
+        queryset = Order.objects.select_related('customer').prefetch_related('items')
         if user.user_type == 'admin':
-            return Order.objects.all()
+            return queryset
         else:
-            return Order.objects.filter(customer=user)
+            return queryset.filter(customer=user)
     
     def perform_update(self, serializer):
         order = serializer.save()
@@ -56,79 +111,116 @@ class OrderDetailView(generics.RetrieveUpdateAPIView):
         if 'status' in serializer.validated_data:
             send_order_notification(order, 'status_update')
 
+@api_view(['POST'])
+@permission_classes([AdminOnlyPermission])
+def bulk_status_update(request):
+    """Move many orders to one status with a single UPDATE
+    
+    Body: {"status": "in_process", "ids": [1, 2, 3]} or
+    {"status": "in_process", "filter": {"status": "new", "delivery_date": "2024-03-01"}}
+    """
+    target = request.data.get('status')
+    if target not in dict(Order.STATUS_CHOICES):
+        return Response({'error': 'A valid target status is required'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    ids = request.data.get('ids')
+    filters = request.data.get('filter')
+    missing = []
+    if ids is not None:
+        # A string would otherwise be read one digit at a time
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'ids must be a non-empty list of order ids'}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = [int(order_id) for order_id in ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be a list of order ids'}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        orders = Order.objects.filter(id__in=ids)
+        found = set(orders.values_list('id', flat=True))
+        missing = [{'id': order_id, 'result': 'not_found'} for order_id in dict.fromkeys(ids) if order_id not in found]
+    elif filters is not None:
+        # filter_orders() ignores what it does not know, which would select every order
+        if not isinstance(filters, dict):
+            return Response({'error': 'filter must be an object'}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        unknown = sorted(set(filters) - set(ORDER_FILTERS))
+        if unknown:
+            return Response({'error': f"Unknown filter keys: {', '.join(map(str, unknown))}"}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        if not any(filters.get(key) for key in ORDER_FILTERS):
+            return Response({'error': f"filter needs at least one of {', '.join(ORDER_FILTERS)}"}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        orders = filter_orders(Order.objects.all(), filters, is_admin=True)
+    else:
+        return Response({'error': 'Provide either ids or a filter'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    results = bulk_transition(orders, target)
+    return Response({
+        'status': target,
+        'updated': sum(1 for result in results if result['result'] == 'updated'),
+        'results': results + missing,
+    })
+
 @api_view(['GET'])
 @permission_classes([AdminOnlyPermission])
 def order_analytics(request):
-    """Get order analytics for admin dashboard"""
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    
-    # Daily sales
-    daily_sales = Order.objects.filter(
-        created_at__date=today,
-        status__in=['completed', 'in_process']
-    ).aggregate(
-        total_revenue=Sum('total'),
-        total_orders=Count('id')
-    )
+    """Get order analytics for admin dashboard (served from the DailySales rollup)"""
+    start, end = parse_date_range(request.query_params)
+    bucket = request.query_params.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return Response({'error': f"bucket must be one of {', '.join(BUCKETS)}"}, 
+                       status=status.HTTP_400_BAD_REQUEST)
     
-    # Weekly sales
-    weekly_sales = Order.objects.filter(
-        created_at__date__gte=week_ago,
-        status__in=['completed', 'in_process']
-    ).aggregate(
-        total_revenue=Sum('total'),
-        total_orders=Count('id')
-    )
-    
-    # Monthly sales
-    monthly_sales = Order.objects.filter(
-        created_at__date__gte=month_ago,
-        status__in=['completed', 'in_process']
-    ).aggregate(
-        total_revenue=Sum('total'),
-        total_orders=Count('id')
-    )
+    data = dashboard(start, end, bucket)
     
     # New vs returning customers this month
     from apps.accounts.models import User
-    new_customers = User.objects.filter(
+    month_ago = timezone.now().date() - timedelta(days=30)
+    data['new_customers_this_month'] = User.objects.filter(
         user_type='customer',
         date_joined__date__gte=month_ago
     ).count()
     
-    # Order status distribution
-    status_distribution = Order.objects.values('status').annotate(
-        count=Count('id')
-    )
-    
-    return Response({
-        'daily_sales': daily_sales,
-        'weekly_sales': weekly_sales,
-        'monthly_sales': monthly_sales,
-        'new_customers_this_month': new_customers,
-        'status_distribution': list(status_distribution),
-    })
+    return Response(data)
 
-@api_view(['GET', 'POST'])
+def _cart_mutation_response(request, product_id, item_id=None, default='line'):
+    """Full cart with ?response=cart, or just the changed line and totals with ?response=line"""
+    state = cart_store.get(request.user.pk)
+    if request.query_params.get('response', default) == 'cart':
+        return Response(cart_data(state, request.user.pk))
+    return Response(cart_delta(state, product_id, item_id))
+
+def _cart_quantity(request):
+    try:
+        quantity = int(request.data.get('quantity', 1))
+    except (TypeError, ValueError):
+        quantity = 0
+    if quantity < 1:
+        raise ValidationError({'quantity': 'Must be a positive whole number'})
+    return quantity
+
+@api_view(['GET', 'POST', 'PUT', 'PATCH'])
 @permission_classes([permissions.IsAuthenticated])
 def cart_view(request):
-    """Get or create customer cart"""
+    """Get the customer cart, add one item, or set many lines at once
+    
+    PUT replaces the cart with the listed {product_id, quantity} lines; PATCH
+    only touches the listed lines. Quantity 0 removes a line.
+    """
     if request.user.user_type != 'customer':
         return Response({'error': 'Only customers can access cart'}, 
                        status=status.HTTP_403_FORBIDDEN)
     
-    cart, created = Cart.objects.get_or_create(customer=request.user)
-    
     if request.method == 'GET':
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        return Response(cart_data(cart_store.get(request.user.pk), request.user.pk))
     
     elif request.method == 'POST':
         # Add item to cart
         product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity', 1)
+        quantity = _cart_quantity(request)
         
         try:
             from apps.products.models import Product
@@ -138,83 +230,225 @@ def cart_view(request):
                 return Response({'error': 'Product not available'}, 
                                status=status.HTTP_400_BAD_REQUEST)
             
-            if product.stock_quantity < quantity:
-                return Response({'error': f'Not enough stock. Available: {product.stock_quantity}'}, 
+            line = cart_store.get(request.user.pk)['lines'].get(product.pk)
+            try:
+                hold(request.user.pk, {product.pk: quantity + (line['quantity'] if line else 0)})
+            except InsufficientStock as e:
+                return Response({'error': f'Not enough stock. Available: {e.shortages[product.pk]}'}, 
                                status=status.HTTP_400_BAD_REQUEST)
             
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=product,
-                defaults={'quantity': quantity}
-            )
-            
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
+            cart_store.add(request.user.pk, product.pk, quantity)
+            return _cart_mutation_response(request, product.pk, default='cart')
             
-            serializer = CartSerializer(cart)
-            return Response(serializer.data)
-            
-        except Product.DoesNotExist:
+        except (Product.DoesNotExist, ValueError, TypeError):
             return Response({'error': 'Product not found'}, 
                            status=status.HTTP_404_NOT_FOUND)
+    
+    else:
+        # Accept either a bare list of lines or {"items": [...]}
+        items = request.data if isinstance(request.data, list) else request.data.get('items')
+        serializer = CartBatchSerializer(data={'items': items}, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        
+        lines = serializer.validated_data['items']
+        quantities = {line['product_id']: line['quantity'] for line in lines}
+        try:
+            hold(request.user.pk, quantities, replace=request.method == 'PUT')
+        except InsufficientStock as e:
+            # Someone took the stock between validation and the hold
+            raise ValidationError({'items': [
+                {'quantity': [f"Not enough stock. Available: {e.shortages[line['product_id']]}"]}
+                if line['product_id'] in e.shortages else {}
+                for line in lines
+            ]})
+        
+        cart_store.apply(request.user.pk, quantities, replace=request.method == 'PUT')
+        return Response(cart_data(cart_store.get(request.user.pk), request.user.pk))
+
+def _change_cart_line(request, product_id, item_id=None):
+    """PUT a new quantity for, or DELETE, the cart line of one product"""
+    customer_id = request.user.pk
+    if request.method == 'PUT':
+        quantity = _cart_quantity(request)
+        try:
+            hold(customer_id, {product_id: quantity})
+        except InsufficientStock as e:
+            return Response({'error': f'Not enough stock. Available: {e.shortages[product_id]}'}, 
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        cart_store.set_quantity(customer_id, product_id, quantity)
+    
+    elif request.method == 'DELETE':
+        release(customer_id, [product_id])
+        cart_store.remove(customer_id, product_id)
+    
+    return _cart_mutation_response(request, product_id, item_id)
 
 @api_view(['PUT', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def cart_item_view(request, item_id):
-    """Update or remove cart item"""
+    """Update or remove cart item (item_id is the CartItem id)
+    
+    Responds with the changed line and new totals; ?response=cart returns the whole cart.
+    """
     if request.user.user_type != 'customer':
         return Response({'error': 'Only customers can modify cart'}, 
                        status=status.HTTP_403_FORBIDDEN)
     
-    try:
-        cart = Cart.objects.get(customer=request.user)
-        cart_item = CartItem.objects.get(id=item_id, cart=cart)
-        
-        if request.method == 'PUT':
-            quantity = request.data.get('quantity', 1)
-            
-            if cart_item.product.stock_quantity < quantity:
-                return Response({'error': f'Not enough stock. Available: {cart_item.product.stock_quantity}'}, 
-                               status=status.HTTP_400_BAD_REQUEST)
-            
-            cart_item.quantity = quantity
-            cart_item.save()
-            
-            serializer = CartSerializer(cart)
-            return Response(serializer.data)
-        
-        elif request.method == 'DELETE':
-            cart_item.delete()
-            serializer = CartSerializer(cart)
-            return Response(serializer.data)
-            
-    except (Cart.DoesNotExist, CartItem.DoesNotExist):
+    product_id = cart_store.find_line(request.user.pk, item_id)
+    if product_id is None:
         return Response({'error': 'Cart item not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
+    return _change_cart_line(request, product_id, item_id)
 
-@api_view(['POST'])
+@api_view(['PUT', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def cart_product_view(request, product_id):
+    """Update or remove the cart line of a product, addressed by product id"""
+    if request.user.user_type != 'customer':
+        return Response({'error': 'Only customers can modify cart'}, 
+                       status=status.HTTP_403_FORBIDDEN)
+    
+    if product_id not in cart_store.get(request.user.pk)['lines']:
+        return Response({'error': 'Cart item not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    return _change_cart_line(request, product_id)
+
+def _get_customer_order(request, order_id):
+    if request.user.user_type == 'admin':
+        return Order.objects.get(id=order_id)
+    return Order.objects.get(id=order_id, customer=request.user)
+
+@api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
 def generate_invoice(request, order_id):
-    """Generate PDF invoice for order"""
+    """Report invoice render status, or (POST) make sure the invoice PDF is current
+    
+    An unchanged invoice answers 200 straight away; otherwise the PDF is rendered
+    in the background and the response is 202 with render_status 'pending'.
+    """
     try:
-        if request.user.user_type == 'admin':
-            order = Order.objects.get(id=order_id)
-        else:
-            order = Order.objects.get(id=order_id, customer=request.user)
-        
-        # Create or get invoice
-        invoice, created = Invoice.objects.get_or_create(order=order)
-        
-        # Generate PDF
-        from .utils import generate_invoice_pdf
-        pdf_path = generate_invoice_pdf(invoice)
-        invoice.pdf_file = pdf_path
-        invoice.save()
-        
-        serializer = InvoiceSerializer(invoice)
-        return Response(serializer.data)
-        
+        order = _get_customer_order(request, order_id)
     except Order.DoesNotExist:
         return Response({'error': 'Order not found'}, 
-                       status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+                       status=status.HTTP_404_NOT_FOUND)
+    
+    if request.method == 'GET':
+        try:
+            invoice = Invoice.objects.get(order=order)
+        except Invoice.DoesNotExist:
+            return Response({'error': 'Invoice not found'}, 
+                           status=status.HTTP_404_NOT_FOUND)
+        return Response(InvoiceSerializer(invoice).data)
+    
+    # Create or get invoice
+    invoice, created = Invoice.objects.get_or_create(order=order)
+    ready = request_invoice_render(invoice)
+    
+    serializer = InvoiceSerializer(invoice)
+    return Response(serializer.data, status=status.HTTP_200_OK if ready else status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def download_invoice(request, order_id):
+    """Download the rendered invoice PDF (ETag is the content fingerprint)"""
+    invoices = Invoice.objects.filter(order_id=order_id)
+    if request.user.user_type != 'admin':
+        invoices = invoices.filter(order__customer=request.user)
+    invoice = invoices.first()
+    if invoice is None:
+        return Response({'error': 'Invoice not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    
+    if invoice.render_status != 'ready' or not invoice.pdf_file:
+        return Response({'render_status': invoice.render_status}, 
+                       status=status.HTTP_202_ACCEPTED)
+    
+    etag = f'"{invoice.fingerprint}"'
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            invoice.pdf_file.open('rb'),
+            as_attachment=True,
+            filename=f"invoice_{invoice.invoice_number}.pdf",
+            content_type='application/pdf',
+        )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def monthly_statements(request):
+    """Stream a ZIP of invoice PDFs for all orders in ?start=..&end= (optionally ?customer=)"""
+    start, end = parse_date_range(request.query_params)
+    if not start or not end:
+        return Response({'error': 'start and end are required'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    customer_ids = [int(c) for c in request.query_params.getlist('customer') if c.isdigit()]
+    orders = statement_orders(start, end, customer_ids)
+    
+    def progress(done, elapsed):
+        if done % 100 == 0:
+            logger.info(f"Statements {start}..{end}: {done} PDFs, {done / elapsed:.1f} PDFs/s")
+    
+    response = StreamingHttpResponse(
+        stream_statement_zip(orders, progress=progress),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="statements_{start}_{end}.zip"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def delivery_manifest(request):
+    """Picking manifest for a delivery day (?delivery_date=, ?status=, ?view=orders, ?export=csv|pdf)"""
+    try:
+        delivery_date = parse_date(request.query_params.get('delivery_date', ''))
+    except ValueError:
+        delivery_date = None
+    if delivery_date is None:
+        return Response({'error': 'delivery_date (YYYY-MM-DD) is required'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    statuses = request.query_params.getlist('status') or PACKING_STATUSES
+    per_order = request.query_params.get('view') == 'orders'
+    export = request.query_params.get('export')
+    suffix = 'packing_lists' if per_order else 'manifest'
+    
+    if export == 'csv':
+        response = StreamingHttpResponse(
+            manifest_csv_rows(delivery_date, statuses, per_order),
+            content_type='text/csv',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{suffix}_{delivery_date}.csv"'
+        return response
+    
+    if export == 'pdf':
+        response = HttpResponse(manifest_pdf(delivery_date, statuses, per_order), 
+                                content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{suffix}_{delivery_date}.pdf"'
+        return response
+    
+    data = {'delivery_date': delivery_date, 'statuses': list(statuses)}
+    if per_order:
+        data['orders'] = list(packing_lists(delivery_date, statuses))
+    else:
+        data['products'] = picking_manifest(delivery_date, statuses)
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def export_orders_view(request):
+    """Stream every matching order with its items (?export=ndjson|csv, ?start=, ?end=, list filters)"""
+    start, end = parse_date_range(request.query_params)
+    orders = filter_orders(Order.objects.all(), request.query_params, is_admin=True)
+    if start:
+        orders = orders.filter(created_at__date__gte=start)
+    if end:
+        orders = orders.filter(created_at__date__lte=end)
+    
+    export_format = request.query_params.get('export', 'ndjson')
+    return streaming_export(export_orders(orders, export_format), 'orders', export_format)
@@ -0,0 +1,78 @@
+"""Low-stock detection on the stock write paths.
+
+Write paths report each stock change as (product_id, was_low, is_low),
+where "low" means stock_quantity <= low_stock_threshold. Going from not
+low to low is a crossing, and a crossing is marked pending unless the
+product was already alerted within LOW_STOCK_ALERT_COOLDOWN, so a product
+bouncing around its threshold alerts once. Crossings within
+LOW_STOCK_DIGEST_WINDOW of each other go out as a single digest email,
+which leaves out products restocked in the meantime. Only products the
+digest names start their cooldown; the others alert on their next crossing.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+DIGEST_SCHEDULED_KEY = 'stock:digest:scheduled'
+
+def _cache():
+    return caches[getattr(settings, 'LOW_STOCK_CACHE_ALIAS', 'default')]
+
+def alert_cooldown():
+    return timedelta(seconds=getattr(settings, 'LOW_STOCK_ALERT_COOLDOWN', 6 * 60 * 60))
+
+def digest_window():
+    return getattr(settings, 'LOW_STOCK_DIGEST_WINDOW', 5 * 60)
+
+def is_low(stock_quantity, low_stock_threshold):
+    return stock_quantity <= low_stock_threshold
+
+@transaction.atomic
+def note_stock_changes(changes):
+    """Mark every product that just crossed into low stock as pending; returns their ids"""
+    from .models import Product
+    crossed = [product_id for product_id, was_low, now_low in changes if now_low and not was_low]
+    if not crossed:
+        return []
+
+    now = timezone.now()
+    due = Product.objects.filter(pk__in=crossed).filter(
+        Q(low_stock_alerted_at__isnull=True) | Q(low_stock_alerted_at__lt=now - alert_cooldown())
+    )
+    pending = list(due.select_for_update().values_list('pk', flat=True))
+    if pending:
+        Product.objects.filter(pk__in=pending, low_stock_pending_at__isnull=True).update(low_stock_pending_at=now)
+        transaction.on_commit(schedule_digest)
+    return pending
+
+def schedule_digest():
+    """Queue one digest per window; later alerts in the window ride along with it"""
+    from .utils import send_low_stock_digest_task
+    window = digest_window()
+    if _cache().add(DIGEST_SCHEDULED_KEY, 1, window):
+        send_low_stock_digest_task.apply_async(countdown=window)
+
+def pending_alerts():
+    """Pending products that are still low, and the time the digest started"""
+    from .models import Product
+    started = timezone.now()
+    products = Product.objects.filter(
+        low_stock_pending_at__lte=started,
+        stock_quantity__lte=F('low_stock_threshold'),
+    ).order_by('stock_quantity', 'name').select_for_update()
+    return list(products), started
+
+@transaction.atomic
+def send_pending_alerts():
+    from apps.notifications.utils import send_low_stock_digest
+    from .models import Product
+    products, started = pending_alerts()
+    # Products restocked before the digest are not stamped, so their next crossing still alerts
+    Product.objects.filter(pk__in=[product.pk for product in products]).update(low_stock_alerted_at=started)
+    Product.objects.filter(low_stock_pending_at__lte=started).update(low_stock_pending_at=None)
+    if products:
+        transaction.on_commit(lambda: send_low_stock_digest(products))
+    return len(products)
@@ -0,0 +1,97 @@
+"""Catalog versioning and cached, conditional catalog responses.
+
+Any write to a Product or Category bumps a version counter kept in the
+cache. Serialized catalog responses are cached under the version plus the
+request path and query, so a bump invalidates every page at once without
+deleting anything. The version also forms the ETag, which lets a
+revalidating client get its 304 from two cache reads and no catalog query.
+Reads still require an authenticated user, so the responses are private.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+
+def _cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+def catalog_state():
+    """Current (version, last modified timestamp) of the catalog"""
+    cache = _cache()
+    state = cache.get_many([VERSION_KEY, MODIFIED_KEY])
+    if VERSION_KEY not in state:
+        # Start from the clock so a flushed cache never reissues an old version
+        now = time.time()
+        cache.add(VERSION_KEY, int(now * 1000), None)
+        cache.add(MODIFIED_KEY, int(now), None)
+        state = cache.get_many([VERSION_KEY, MODIFIED_KEY])
+    return state[VERSION_KEY], state.get(MODIFIED_KEY, int(time.time()))
+
+def bump_catalog_version():
+    """Invalidate every cached catalog page once the current transaction commits"""
+    def bump():
+        cache = _cache()
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            # Never set (or evicted); catalog_state() will start a new one
+            pass
+        cache.set(MODIFIED_KEY, int(timezone.now().timestamp()), None)
+    transaction.on_commit(bump)
+
+def _request_digest(request):
+    query = sorted(request.GET.lists())
+    return hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+
+def _is_fresh(request, etag, modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and modified <= since
+
+def cached_catalog_response(request, render):
+    """Answer a catalog GET from the cache, calling ``render()`` only on a miss
+
+    ``render`` returns a DRF Response; only 200 responses are cached.
+    """
+    from rest_framework.response import Response
+    version, modified = catalog_state()
+    digest = _request_digest(request)
+    etag = f'"{version}-{digest[:16]}"'
+    headers = {'ETag': etag, 'Last-Modified': http_date(modified)}
+
+    if _is_fresh(request, etag, modified):
+        response = HttpResponseNotModified(headers=headers)
+    else:
+        key = f'catalog:page:{version}:{digest}'
+        data = _cache().get(key)
+        if data is not None:
+            response = Response(data)
+        else:
+            response = render()
+            if response.status_code != 200:
+                return response
+            _cache().set(key, response.data, getattr(settings, 'CATALOG_CACHE_TTL', 60 * 60 * 24))
+        for header, value in headers.items():
+            response[header] = value
+
+    # Clients may keep the page but must revalidate before reusing it; shared
+    # caches must not, as only authenticated users may read the catalog
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization', 'Cookie'])
+    return response
+
+class CachedCatalogMixin:
+    """Serve GETs of a catalog view through cached_catalog_response()"""
+
+    def get(self, request, *args, **kwargs):
+        return cached_catalog_response(request, lambda: super(CachedCatalogMixin, self).get(request, *args, **kwargs))
@@ -0,0 +1,228 @@
+"""Demand forecasts and reorder points for the whole catalog at once.
+
+Daily demand for every product comes out of the product sales rollup
+(apps/orders ProductDailySales) into one products x days NumPy matrix, and
+every statistic below is a whole-matrix operation, so the catalog is
+forecast in a few array passes rather than a Python loop per product:
+
+- weekday seasonality: each product's mean demand per weekday over the
+  history, relative to its overall mean and shrunk towards a flat week
+  while there are few observations;
+- level: moving average of the deseasonalized demand over the last
+  FORECAST_WINDOW_DAYS, with its standard deviation as the demand noise;
+- reorder point: seasonal demand over the lead time plus a safety stock of
+  z * sigma * sqrt(lead time) for the REORDER_SERVICE_LEVEL.
+
+A product's reorder point becomes its suggested low_stock_threshold, so
+the low-stock alerts fire when it is time to reorder.
+"""
+import math
+from datetime import timedelta
+from itertools import chain
+from statistics import NormalDist
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, ExpressionWrapper, F, Func, IntegerField, Sum, Value
+from django.utils import timezone
+
+# Weekday observations worth as much as the flat-week prior
+SEASONALITY_PRIOR_DAYS = 8
+# Fewer recent selling days than this and a product gets no suggestion
+MIN_HISTORY_DAYS = 7
+
+def forecast_settings():
+    return {
+        'history_days': getattr(settings, 'FORECAST_HISTORY_DAYS', 365),
+        'window': getattr(settings, 'FORECAST_WINDOW_DAYS', 28),
+        'lead_time': getattr(settings, 'REORDER_LEAD_TIME_DAYS', 2),
+        'cover_days': getattr(settings, 'REORDER_COVER_DAYS', 3),
+        'service_level': getattr(settings, 'REORDER_SERVICE_LEVEL', 0.95),
+    }
+
+def _divide(numerator, denominator, fill):
+    out = np.full(np.broadcast(numerator, denominator).shape, fill, dtype=float)
+    return np.divide(numerator, denominator, out=out, where=denominator > 0)
+
+def compute_reorder_points(demand, first_day, weekdays, stock, lead_weekdays, cover_weekdays,
+                           window=28, service_level=0.95):
+    """Forecast every product (row) of a demand matrix at once
+
+    ``demand`` is (products, days) units sold per day, oldest first;
+    ``first_day`` is each product's first column on sale; ``weekdays`` the
+    weekday of each column; ``stock`` current stock per product;
+    ``lead_weekdays`` and ``cover_weekdays`` the weekdays of the days a
+    reorder must last through and the days an order should cover.
+    Returns a dict of per-product arrays.
+    """
+    demand = np.asarray(demand, dtype=float)
+    products, days = demand.shape
+    weekdays = np.asarray(weekdays)
+    window = min(window, days)
+    active = np.arange(days)[None, :] >= np.asarray(first_day)[:, None]
+    demand = np.where(active, demand, 0.0)
+
+    # Weekday profile: one matrix product per statistic instead of a groupby per product
+    weekday_columns = np.eye(7)[weekdays]
+    weekday_totals = demand @ weekday_columns
+    weekday_days = active.astype(float) @ weekday_columns
+    mean = _divide(weekday_totals.sum(axis=1), weekday_days.sum(axis=1), 0.0)
+    raw_index = _divide(_divide(weekday_totals, weekday_days, 0.0), mean[:, None], 1.0)
+    weight = weekday_days / (weekday_days + SEASONALITY_PRIOR_DAYS)
+    seasonal = np.where(weekday_days > 0, 1.0 + weight * (raw_index - 1.0), 1.0)
+
+    # Moving averages over the recent window, raw and deseasonalized
+    recent = demand[:, -window:]
+    recent_active = active[:, -window:]
+    recent_days = recent_active.sum(axis=1)
+    deseasonalized = _divide(recent, seasonal[:, weekdays[-window:]], 0.0)
+    level = _divide(deseasonalized.sum(axis=1), recent_days, 0.0)
+    residuals = np.where(recent_active, deseasonalized - level[:, None], 0.0)
+    sigma = np.sqrt(_divide((residuals ** 2).sum(axis=1), recent_days - 1, 0.0))
+    week = min(7, days)
+    weekly_average = _divide(recent[:, -week:].sum(axis=1), recent_active[:, -week:].sum(axis=1), 0.0)
+
+    lead_time = len(lead_weekdays)
+    lead_demand = level * seasonal[:, lead_weekdays].sum(axis=1)
+    safety_stock = NormalDist().inv_cdf(service_level) * sigma * math.sqrt(lead_time)
+    reorder_point = np.ceil(lead_demand + safety_stock)
+    cover_demand = level * seasonal[:, cover_weekdays].sum(axis=1)
+    stock = np.asarray(stock, dtype=float)
+    order_quantity = np.maximum(np.ceil(reorder_point + cover_demand - stock), 0.0)
+
+    return {
+        'has_history': recent_days >= min(MIN_HISTORY_DAYS, window),
+        'weekly_average': weekly_average,
+        'moving_average': _divide(recent.sum(axis=1), recent_days, 0.0),
+        'level': level,
+        'sigma': sigma,
+        'seasonality': seasonal,
+        'forecast_next_day': level * seasonal[:, lead_weekdays[0]] if lead_time else level,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point.astype(int),
+        'order_quantity': np.where(stock <= reorder_point, order_quantity, 0.0).astype(int),
+        'days_of_cover': _divide(stock, level, np.inf),
+    }
+
+def load_demand(history_days, today=None):
+    """(products, demand matrix, first selling column per product, column weekdays) for products on sale"""
+    from apps.orders.analytics import SOLD_STATUSES
+    from apps.orders.models import ProductDailySales
+    from .models import Product
+    today = today or timezone.localdate()
+    start = today - timedelta(days=history_days)
+    products = list(
+        Product.objects.exclude(availability_status='discontinued').order_by('pk').values(
+            'pk', 'name', 'stock_quantity', 'low_stock_threshold', 'created_at'
+        )
+    )
+    first_day, weekdays = _calendar(products, start, history_days)
+    if not products:
+        return products, np.zeros((0, history_days)), first_day, weekdays
+
+    # Yesterday is the last complete day. The database sums the statuses of a
+    # (product, day) and encodes it as product_id * days + column, so rows
+    # arrive as two plain integers and are decoded as whole arrays below.
+    column = Func(F('date'), Value(start), template='(%(expressions)s)', arg_joiner=' - ', output_field=IntegerField())
+    sales = ProductDailySales.objects.filter(
+        date__gte=start, date__lt=today, status__in=SOLD_STATUSES, units__gt=0,
+    ).order_by().values(
+        code=ExpressionWrapper(F('product_id') * history_days + column, output_field=BigIntegerField()),
+    ).annotate(total=Sum('units')).values_list('code', 'total')
+    flat = np.fromiter(chain.from_iterable(sales.iterator(chunk_size=50000)), dtype=np.int64)
+    codes, units = flat[0::2], flat[1::2]
+
+    # Products are ordered by pk, so a binary search maps ids to matrix rows;
+    # sales of discontinued products find no matching row and are dropped
+    product_ids, columns = np.divmod(codes, history_days)
+    pks = np.fromiter((product['pk'] for product in products), dtype=np.int64, count=len(products))
+    rows = np.minimum(np.searchsorted(pks, product_ids), len(pks) - 1)
+    on_sale = pks[rows] == product_ids
+    cells = rows[on_sale] * history_days + columns[on_sale]
+    return products, demand_matrix(cells, units[on_sale], len(products), history_days), first_day, weekdays
+
+def demand_matrix(cells, units, products, days):
+    """(products, days) matrix from flat row * days + column cell indexes; repeated cells add up"""
+    return np.bincount(
+        np.asarray(cells, dtype=np.intp), weights=np.asarray(units, dtype=float), minlength=products * days
+    ).reshape(products, days)
+
+def _calendar(products, start, history_days):
+    first_day = np.array([
+        max((timezone.localdate(product['created_at']) - start).days, 0) for product in products
+    ], dtype=np.intp)
+    weekdays = (np.arange(history_days) + start.weekday()) % 7
+    return first_day, weekdays
+
+def reorder_report(today=None, **overrides):
+    """One row per product on sale with its forecast and suggested threshold"""
+    options = {**forecast_settings(), **overrides}
+    today = today or timezone.localdate()
+    products, demand, first_day, weekdays = load_demand(options['history_days'], today)
+    if not products:
+        return []
+
+    upcoming = [(today + timedelta(days=offset)).weekday() for offset in range(
+        options['lead_time'] + options['cover_days']
+    )]
+    result = compute_reorder_points(
+        demand, first_day, weekdays,
+        stock=[product['stock_quantity'] for product in products],
+        lead_weekdays=upcoming[:options['lead_time']],
+        cover_weekdays=upcoming[options['lead_time']:],
+        window=options['window'],
+        service_level=options['service_level'],
+    )
+
+    # Plain lists are much cheaper to index per row than NumPy arrays
+    columns = {name: values.tolist() for name, values in result.items() if name != 'seasonality'}
+    report = []
+    for row, product in enumerate(products):
+        reorder_point = columns['reorder_point'][row]
+        report.append({
+            'product_id': product['pk'],
+            'name': product['name'],
+            'stock_quantity': product['stock_quantity'],
+            'weekly_average': round(columns['weekly_average'][row], 2),
+            'moving_average': round(columns['moving_average'][row], 2),
+            'forecast_next_day': round(columns['forecast_next_day'][row], 2),
+            'safety_stock': round(columns['safety_stock'][row], 2),
+            'reorder_point': reorder_point,
+            'order_quantity': columns['order_quantity'][row],
+            'days_of_cover': round(min(columns['days_of_cover'][row], 999.0), 1),
+            'current_threshold': product['low_stock_threshold'],
+            # Without enough history the current threshold stands
+            'suggested_threshold': reorder_point if columns['has_history'][row] else product['low_stock_threshold'],
+        })
+    return report
+
+@transaction.atomic
+def apply_thresholds(report):
+    """Write suggested thresholds that differ from the current ones; returns how many changed"""
+    from .alerts import is_low, note_stock_changes
+    from .catalog import bump_catalog_version
+    from .models import Product
+    suggested = {
+        row['product_id']: row['suggested_threshold']
+        for row in report if row['suggested_threshold'] != row['current_threshold']
+    }
+    if not suggested:
+        return 0
+
+    now = timezone.now()
+    changed, stock_changes = [], []
+    products = Product.objects.select_for_update().filter(pk__in=list(suggested)).order_by('pk').only(
+        'pk', 'stock_quantity', 'low_stock_threshold'
+    )
+    for product in products:
+        was_low = is_low(product.stock_quantity, product.low_stock_threshold)
+        product.low_stock_threshold = suggested[product.pk]
+        product.updated_at = now
+        changed.append(product)
+        stock_changes.append((product.pk, was_low, is_low(product.stock_quantity, product.low_stock_threshold)))
+
+    # bulk_update skips save() and its signals, so alerts and the catalog cache are handled here
+    Product.objects.bulk_update(changed, ['low_stock_threshold', 'updated_at'], batch_size=1000)
+    note_stock_changes(stock_changes)
+    bump_catalog_version()
+    return len(changed)
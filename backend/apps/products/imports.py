@@ -0,0 +1,328 @@
+"""Bulk catalog import from supplier CSV files (stock receipts and price lists).
+
+A header row is required. Recognised columns, of which only id or name is mandatory:
+
+    id, name             match an existing product (by id, else by case-insensitive name)
+    category             category name; moves an existing product, required for a new one
+    price                new unit price
+    stock_quantity       counted stock, recorded as an 'adjustment' movement
+    stock_in             units received, recorded as an 'in' movement (after any count)
+    low_stock_threshold, unit, description
+
+Rows naming no existing product create one when they carry name, category
+and price. The whole file is validated before anything is written; a valid
+file is applied in one transaction with bulk_update and bulk_create, so a
+10k-row file costs a few dozen queries rather than a save per row. Because
+bulk writes skip Product.save() and its signals, the import keeps category
+counts, the search log, low-stock alerts and the catalog version in step itself.
+"""
+import csv
+import io
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from .alerts import is_low, note_stock_changes
+from .catalog import bump_catalog_version
+from .models import Category, Product, StockMovement
+from .search import log_product_changes
+
+COLUMNS = {
+    'id', 'name', 'category', 'price', 'stock_quantity', 'stock_in', 'low_stock_threshold', 'unit', 'description',
+}
+# Largest value a PositiveIntegerField (PostgreSQL integer) holds
+MAX_INTEGER = 2 ** 31 - 1
+_price = Product._meta.get_field('price')
+MAX_PRICE = Decimal(10) ** (_price.max_digits - _price.decimal_places) - Decimal(10) ** -_price.decimal_places
+# (column, type, minimum, maximum)
+NUMBER_COLUMNS = (
+    ('id', int, 1, MAX_INTEGER),
+    ('price', Decimal, Decimal('0.01'), MAX_PRICE),
+    ('stock_quantity', int, 0, MAX_INTEGER),
+    ('stock_in', int, 1, MAX_INTEGER),
+    ('low_stock_threshold', int, 0, MAX_INTEGER),
+)
+TEXT_COLUMNS = ('name', 'category', 'unit', 'description')
+# Product fields an import may change on an existing product
+UPDATE_FIELDS = (
+    'category_id', 'price', 'stock_quantity', 'availability_status', 'low_stock_threshold', 'unit', 'description',
+)
+LOOKUP_BATCH = 2000
+WRITE_BATCH = 1000
+
+class CatalogImportError(Exception):
+    """The file as a whole cannot be imported (not CSV, unknown columns, ...)"""
+
+def read_rows(data):
+    """CSV rows as {column: stripped value} dicts; ``data`` is text or UTF-8 bytes"""
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise CatalogImportError('The file is not UTF-8 text')
+    reader = csv.DictReader(io.StringIO(data))
+    if not reader.fieldnames:
+        raise CatalogImportError('The file is empty')
+    columns = [column.strip().lower() for column in reader.fieldnames]
+    unknown = set(columns) - COLUMNS
+    if unknown:
+        raise CatalogImportError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    if not {'id', 'name'} & set(columns):
+        raise CatalogImportError('The file needs an id or a name column')
+    reader.fieldnames = columns
+    try:
+        return [
+            {column: (value or '').strip() for column, value in row.items() if column is not None}
+            for row in reader
+        ]
+    except csv.Error as e:
+        raise CatalogImportError(f'Malformed CSV: {e}')
+
+def parse_row(row):
+    """Typed values of one row and a {column: message} dict of its problems"""
+    values, errors = {}, {}
+    for column, convert, minimum, maximum in NUMBER_COLUMNS:
+        values[column] = None
+        if not row.get(column):
+            continue
+        try:
+            value = convert(row[column])
+            if convert is Decimal and not value.is_finite():
+                raise ValueError
+        except (ValueError, InvalidOperation):
+            errors[column] = 'Must be a whole number' if convert is int else 'Must be a number'
+            continue
+        if value < minimum:
+            errors[column] = f'Must be at least {minimum}'
+        elif value > maximum:
+            errors[column] = f'Must be at most {maximum}'
+        elif convert is Decimal and value != value.quantize(Decimal('0.01')):
+            errors[column] = 'At most two decimal places'
+        else:
+            values[column] = value
+    for column in TEXT_COLUMNS:
+        values[column] = row.get(column) or None
+    if values['name'] and len(values['name']) > Product._meta.get_field('name').max_length:
+        errors['name'] = 'Too long'
+    if values['unit'] and len(values['unit']) > Product._meta.get_field('unit').max_length:
+        errors['unit'] = 'Too long'
+    if not row.get('id') and not values['name']:
+        errors['id'] = 'Each row needs an id or a name'
+    return values, errors
+
+def _in_batches(queryset, field, values):
+    values = list(values)
+    for offset in range(0, len(values), LOOKUP_BATCH):
+        yield from queryset.filter(**{f'{field}__in': values[offset:offset + LOOKUP_BATCH]})
+
+def plan_import(data):
+    """Validate a whole file and match its rows, without writing anything
+
+    Returns (plan, errors). ``plan`` holds 'updates' as (values, product,
+    category) and 'creates' as (values, category) tuples; ``errors`` is a list of
+    {'row', 'errors'} entries numbered as in a spreadsheet (header is row 1).
+    """
+    rows = [(line, *parse_row(row)) for line, row in enumerate(read_rows(data), start=2)]
+
+    ids = {values['id'] for _, values, _ in rows if values['id']}
+    names = {values['name'].lower() for _, values, _ in rows if values['id'] is None and values['name']}
+    by_id = {product.pk: product for product in _in_batches(Product.objects.all(), 'pk', ids)}
+    by_name = {}
+    for product in _in_batches(Product.objects.annotate(name_key=Lower('name')), 'name_key', names):
+        by_name.setdefault(product.name_key, []).append(product)
+    categories = {category.name.lower(): category for category in Category.objects.all()}
+
+    plan, errors, seen = {'updates': [], 'creates': []}, [], set()
+    for line, values, row_errors in rows:
+        product = None
+        if values['id'] is not None:
+            product = by_id.get(values['id'])
+            if product is None:
+                row_errors['id'] = 'No product with this id'
+        elif values['name']:
+            matches = by_name.get(values['name'].lower(), [])
+            if len(matches) > 1:
+                row_errors['name'] = 'Several products have this name; match by id instead'
+            elif matches:
+                product = matches[0]
+
+        category = None
+        if values['category']:
+            category = categories.get(values['category'].lower())
+            if category is None:
+                row_errors['category'] = 'No category with this name'
+
+        if product is None and not row_errors:
+            missing = [column for column in ('name', 'category', 'price') if not values[column]]
+            if missing:
+                row_errors['id'] = f"No such product; creating one needs {', '.join(missing)}"
+
+        if not row_errors and values['stock_in'] is not None:
+            counted = values['stock_quantity']
+            if counted is None:
+                counted = product.stock_quantity if product else 0
+            if counted + values['stock_in'] > MAX_INTEGER:
+                row_errors['stock_in'] = f'Would take stock above {MAX_INTEGER}'
+
+        key = product.pk if product else (values['name'] or '').lower()
+        if not row_errors and key in seen:
+            row_errors['id'] = 'The same product appears on an earlier row'
+        seen.add(key)
+
+        if row_errors:
+            errors.append({'row': line, 'errors': row_errors})
+        elif product is None:
+            plan['creates'].append((values, category))
+        else:
+            plan['updates'].append((values, product, category))
+    return plan, errors
+
+def _restock(product, values, reason, user, now):
+    """Apply one row's stock columns to a product, returning its StockMovement rows"""
+    movements = []
+    for movement_type, quantity in (
+        ('adjustment', None if values['stock_quantity'] is None else values['stock_quantity'] - product.stock_quantity),
+        ('in', values['stock_in']),
+    ):
+        if not quantity:
+            continue
+        previous_stock = product.stock_quantity
+        product.stock_quantity += quantity
+        if product.stock_quantity > MAX_INTEGER:
+            # Stock grew between validation and the locked re-read
+            raise CatalogImportError(f'Stock of {product.name} would exceed {MAX_INTEGER}')
+        movements.append(StockMovement(
+            product=product,
+            movement_type=movement_type,
+            quantity=quantity,
+            previous_stock=previous_stock,
+            new_stock=product.stock_quantity,
+            reason=reason,
+            created_at=now,
+            created_by=user,
+        ))
+    return movements
+
+def _settle_availability(product):
+    # The same rule as Product.save()
+    if product.stock_quantity == 0 and product.availability_status == 'available':
+        product.availability_status = 'out_of_stock'
+    elif product.stock_quantity > 0 and product.availability_status == 'out_of_stock':
+        product.availability_status = 'available'
+
+def stage_changes(plan, products, reason='Catalog import', user=None):
+    """Apply a plan to in-memory products; returns everything the writes need
+
+    ``products`` maps id to the Product each update row applies to, so the
+    same code serves a dry run (the planned snapshot) and the real import
+    (rows re-read under lock).
+    """
+    now = timezone.now()
+    staged = {
+        'updated': [], 'created': [], 'movements': [], 'fields': set(),
+        'count_deltas': Counter(), 'stock_changes': [],
+    }
+
+    for values, planned, category in plan['updates']:
+        product = products[planned.pk]
+        before = {field: getattr(product, field) for field in UPDATE_FIELDS}
+        was_low = is_low(product.stock_quantity, product.low_stock_threshold)
+
+        staged['movements'].extend(_restock(product, values, reason, user, now))
+        for field in ('price', 'low_stock_threshold', 'unit', 'description'):
+            if values[field] is not None:
+                setattr(product, field, values[field])
+        if category is not None:
+            product.category = category
+        _settle_availability(product)
+
+        changed = [field for field, value in before.items() if getattr(product, field) != value]
+        if not changed:
+            continue
+        staged['fields'].update(changed)
+        if before['availability_status'] == 'available':
+            staged['count_deltas'][before['category_id']] -= 1
+        if product.availability_status == 'available':
+            staged['count_deltas'][product.category_id] += 1
+        staged['stock_changes'].append(
+            (product.pk, was_low, is_low(product.stock_quantity, product.low_stock_threshold))
+        )
+        product.updated_at = now
+        staged['updated'].append(product)
+
+    for values, category in plan['creates']:
+        product = Product(
+            name=values['name'],
+            category=category,
+            description=values['description'] or '',
+            price=values['price'],
+            stock_quantity=0,
+            created_at=now,
+            updated_at=now,
+        )
+        for field in ('low_stock_threshold', 'unit'):
+            if values[field] is not None:
+                setattr(product, field, values[field])
+        staged['movements'].extend(_restock(product, values, reason, user, now))
+        _settle_availability(product)
+        if product.availability_status == 'available':
+            staged['count_deltas'][category.pk] += 1
+        staged['created'].append(product)
+    return staged
+
+def _summary(plan, staged, dry_run):
+    return {
+        'dry_run': dry_run,
+        'rows': len(plan['updates']) + len(plan['creates']),
+        'updated': len(staged['updated']),
+        'created': len(staged['created']),
+        'stock_movements': len(staged['movements']),
+        'availability_changes': sum(abs(delta) for delta in staged['count_deltas'].values()),
+    }
+
+def import_catalog(data, user=None, dry_run=False, reason='Catalog import'):
+    """Validate a CSV file and, unless it has errors or this is a dry run, apply it
+
+    Returns (summary, errors). A file with any row error changes nothing.
+    """
+    plan, errors = plan_import(data)
+    if errors:
+        return None, errors
+
+    if dry_run:
+        products = {product.pk: product for _, product, _ in plan['updates']}
+        return _summary(plan, stage_changes(plan, products, reason, user), dry_run), []
+
+    with transaction.atomic():
+        # Re-read the matched rows under lock (in pk order, like checkout) so
+        # receipts add to the stock as it is now, not as it was when planned
+        ids = sorted(product.pk for _, product, _ in plan['updates'])
+        products = {
+            product.pk: product
+            for product in _in_batches(Product.objects.select_for_update().order_by('pk'), 'pk', ids)
+        }
+        if len(products) < len(ids):
+            raise CatalogImportError('Products were deleted while the file was being imported; try again')
+
+        staged = stage_changes(plan, products, reason, user)
+        if staged['updated']:
+            # Only the columns some row actually changed go into the CASE expressions
+            fields = [field.replace('category_id', 'category') for field in sorted(staged['fields'])]
+            Product.objects.bulk_update(staged['updated'], fields + ['updated_at'], batch_size=WRITE_BATCH)
+        Product.objects.bulk_create(staged['created'], batch_size=WRITE_BATCH)
+        for movement in staged['movements']:
+            # Created products only got their ids from bulk_create
+            movement.product_id = movement.product.pk
+        StockMovement.objects.bulk_create(staged['movements'], batch_size=WRITE_BATCH)
+
+        # What Product.save() and its receivers would have done row by row
+        Category.objects.adjust_available_counts(staged['count_deltas'])
+        note_stock_changes(staged['stock_changes'])
+        log_product_changes(
+            [product.pk for product in staged['updated']] + [product.pk for product in staged['created']]
+        )
+        if staged['updated'] or staged['created']:
+            bump_catalog_version()
+
+    return _summary(plan, staged, dry_run), []
@@ -0,0 +1,67 @@
+"""Stock as of any moment, from periodic snapshots plus the movement ledger.
+
+StockMovement rows are signed deltas (out is negative), so the stock at a
+moment is the nearest earlier snapshot plus the movements between the two.
+Both lookups are range scans on (product, time) indexes, which keeps an
+as-of query at O(log n + k) for k movements since the snapshot, however
+long the ledger grows.
+
+Snapshots are taken from the ledger, not from Product.stock_quantity, and
+STOCK_SNAPSHOT_LAG behind the clock: a movement is stamped before its
+transaction commits, so only a point that far back is safely complete.
+Only products that moved since the previous snapshot get a new one.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from .models import StockMovement, StockSnapshot
+
+def snapshot_lag():
+    return timedelta(seconds=getattr(settings, 'STOCK_SNAPSHOT_LAG', 60 * 60))
+
+def take_snapshots(now=None):
+    """Snapshot every product that moved since the last snapshot; returns how many"""
+    taken_at = (now or timezone.now()) - snapshot_lag()
+    since = StockSnapshot.objects.aggregate(latest=Max('taken_at'))['latest']
+    if since is not None and since >= taken_at:
+        return 0
+
+    movements = StockMovement.objects.filter(created_at__lte=taken_at)
+    if since is not None:
+        movements = movements.filter(created_at__gt=since)
+    # Each product's last movement before the cutoff (PostgreSQL DISTINCT ON)
+    latest = movements.order_by('product_id', '-created_at', '-id').distinct('product_id').values_list(
+        'product_id', 'new_stock'
+    )
+    snapshots = [
+        StockSnapshot(product_id=product_id, taken_at=taken_at, stock_quantity=new_stock)
+        for product_id, new_stock in latest.iterator(chunk_size=5000)
+    ]
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=1000, ignore_conflicts=True)
+    return len(snapshots)
+
+def stock_as_of(product, moment):
+    """The product's stock at ``moment``, or None if it did not exist yet
+
+    Returns {'stock_quantity', 'snapshot_at', 'movements_replayed'}.
+    """
+    if product.created_at > moment:
+        return None
+
+    snapshot = product.stock_snapshots.filter(taken_at__lte=moment).order_by('-taken_at').first()
+    movements = product.stock_movements.filter(created_at__lte=moment)
+    if snapshot is not None:
+        base = snapshot.stock_quantity
+        movements = movements.filter(created_at__gt=snapshot.taken_at)
+    else:
+        # Before any snapshot: start from the stock the ledger first saw
+        first = product.stock_movements.order_by('created_at', 'id').values_list('previous_stock', flat=True).first()
+        base = product.stock_quantity if first is None else first
+
+    replayed = movements.aggregate(change=Sum('quantity'), count=Count('id'))
+    return {
+        'stock_quantity': base + (replayed['change'] or 0),
+        'snapshot_at': snapshot.taken_at if snapshot is not None else None,
+        'movements_replayed': replayed['count'],
+    }
@@ -0,0 +1,125 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.orders.models import ProductDailySales
+from apps.products.forecasting import compute_reorder_points, demand_matrix, load_demand
+from apps.products.models import Category, Product
+
+TIME_BUDGET_S = 5.0
+
+class Command(BaseCommand):
+    help = (
+        'Time loading and forecasting reorder points for a seeded sales rollup '
+        '(default 10k SKUs x 2 years; all data is rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=730)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--in-memory', action='store_true', help='Skip the database and time only the maths')
+
+    def synthetic_sales(self, rng, products, days):
+        """Sparse (cell, units) sales like the rollup query returns, with weekday peaks and slow sellers"""
+        base = rng.gamma(shape=1.2, scale=6.0, size=products)
+        profile = (1.0 + 0.2 * rng.standard_normal((products, 7))).clip(0.2, None)
+        weekdays = np.arange(days) % 7
+        rates = base[:, None] * profile[:, weekdays]
+        sold = rng.poisson(rates)
+        cells = np.flatnonzero(sold)
+        return cells, sold.ravel()[cells]
+
+    def seed_rollup(self, rng, products, days, today):
+        """Bench products and one completed-sales rollup row per product and selling day"""
+        category = Category.objects.create(name='__forecast_bench__')
+        # A fifth of the catalog was added part-way through the history
+        added = rng.integers(0, days // 2, size=products) * (rng.random(products) < 0.2)
+        created = Product.objects.bulk_create([
+            Product(
+                name=f'Bench product {i}',
+                category=category,
+                description='',
+                price=Decimal('2.50'),
+                stock_quantity=int(stock),
+                created_at=timezone.now() - timedelta(days=days - int(offset)),
+            )
+            for i, (offset, stock) in enumerate(zip(added, rng.integers(0, 200, size=products)))
+        ], batch_size=2000)
+
+        # Generated in SQL: millions of rows through bulk_create would dwarf the run being measured
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {ProductDailySales._meta.db_table} (date, product_id, status, units, revenue, line_count)
+                SELECT %s::date + day, product_id, 'completed', units, units * 2.50, 1
+                FROM (
+                    SELECT day, product_id,
+                           ((product_id * 7919 + day * 104729) %% 23
+                            + CASE WHEN (%s + day) %% 7 >= 5 THEN 6 ELSE 0 END) AS units
+                    FROM unnest(%s::bigint[]) AS product_id, generate_series(0, %s - 1) AS day
+                ) AS sales
+                WHERE units > 0
+                """,
+                [today - timedelta(days=days), (today - timedelta(days=days)).weekday(),
+                 [product.pk for product in created], days],
+            )
+            return cursor.rowcount
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        products, days = options['products'], options['days']
+        timings = {}
+
+        if options['in_memory']:
+            cells, units = self.synthetic_sales(rng, products, days)
+            first_day = rng.integers(0, days // 2, size=products) * (rng.random(products) < 0.2)
+            stock = rng.integers(0, 200, size=products)
+            weekdays = np.arange(days) % 7
+            started = time.perf_counter()
+            demand = demand_matrix(cells, units, products, days)
+            timings['build matrix'] = time.perf_counter() - started
+            self.report(self.forecast(demand, first_day, weekdays, stock, timings), products, days, len(cells), timings)
+            return
+
+        today = timezone.localdate()
+        with transaction.atomic():
+            started = time.perf_counter()
+            rows = self.seed_rollup(rng, products, days, today)
+            self.stdout.write(f'seeded {rows} rollup rows in {time.perf_counter() - started:.1f}s (not timed)')
+
+            started = time.perf_counter()
+            catalog, demand, first_day, weekdays = load_demand(days, today)
+            timings['load demand'] = time.perf_counter() - started
+            stock = [product['stock_quantity'] for product in catalog]
+            result = self.forecast(demand, first_day, weekdays, stock, timings)
+            # Other products already in the database are forecast alongside the bench catalog
+            self.report(result, len(catalog), days, rows, timings)
+            transaction.set_rollback(True)
+
+    def forecast(self, demand, first_day, weekdays, stock, timings):
+        started = time.perf_counter()
+        result = compute_reorder_points(
+            demand, first_day, weekdays, stock,
+            lead_weekdays=[0, 1], cover_weekdays=[2, 3, 4],
+        )
+        timings['forecast'] = time.perf_counter() - started
+        return result
+
+    def report(self, result, products, days, sales_days, timings):
+        self.stdout.write(f'{products} products x {days} days, {sales_days} non-zero sales days')
+        for name, seconds in timings.items():
+            self.stdout.write(f'  {name:<14} {seconds:.3f}s')
+        self.stdout.write(
+            f"  {int(result['has_history'].sum())} forecast, {int((result['order_quantity'] > 0).sum())} due, "
+            f"median reorder point {float(np.median(result['reorder_point'])):.0f}"
+        )
+
+        total = sum(timings.values())
+        if total > TIME_BUDGET_S:
+            self.stdout.write(self.style.ERROR(f'{total:.2f}s exceeds the {TIME_BUDGET_S:.0f}s budget'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total:.2f}s within the {TIME_BUDGET_S:.0f}s budget'))
@@ -0,0 +1,80 @@
+import random
+import string
+import time
+from django.core.management.base import BaseCommand
+from apps.products.models import Product
+from apps.products.search import SearchIndex
+
+LATENCY_BUDGET_MS = 5.0
+
+class Command(BaseCommand):
+    help = 'Measure product search latency on a synthetic catalog (or the real one with --database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--database', action='store_true', help='Index the real catalog instead')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def synthetic_catalog(self, rng, count):
+        words = [
+            ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+            for _ in range(20000)
+        ]
+        categories = words[:50]
+        rows = [
+            (pk, ' '.join(rng.sample(words, 3)), ' '.join(rng.sample(words, 12)), rng.choice(categories), True)
+            for pk in range(1, count + 1)
+        ]
+        return rows, words
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['database']:
+            rows = [
+                (pk, name, description, category, status == 'available')
+                for pk, name, description, category, status in Product.objects.values_list(
+                    'pk', 'name', 'description', 'category__name', 'availability_status'
+                )
+            ]
+            words = list({word for row in rows for word in row[1].lower().split()}) or ['a']
+        else:
+            rows, words = self.synthetic_catalog(rng, options['products'])
+
+        index = SearchIndex()
+        started = time.perf_counter()
+        index.load(rows)
+        build_time = time.perf_counter() - started
+
+        # Mix of prefixes (one and two letters included), whole words and one-letter typos
+        queries = []
+        for _ in range(options['queries']):
+            word = rng.choice(words)
+            kind = rng.random()
+            if kind < 0.15:
+                queries.append(word[:rng.randint(1, min(2, len(word)))])
+            elif kind < 0.4:
+                queries.append(word[:rng.randint(1, len(word))])
+            elif kind < 0.7:
+                queries.append(word)
+            else:
+                position = rng.randrange(len(word))
+                queries.append(word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:])
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+
+        self.stdout.write(
+            f'{len(index)} products, {len(index.vocabulary)} terms, built in {build_time:.2f}s; '
+            f'{len(queries)} queries: p50 {p50:.2f}ms, p99 {p99:.2f}ms, max {latencies[-1]:.2f}ms'
+        )
+        if p99 > LATENCY_BUDGET_MS:
+            self.stdout.write(self.style.WARNING(f'p99 exceeds the {LATENCY_BUDGET_MS}ms budget'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'p99 within the {LATENCY_BUDGET_MS}ms budget'))
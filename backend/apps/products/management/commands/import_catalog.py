@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.products.imports import CatalogImportError, import_catalog
+
+class Command(BaseCommand):
+    help = 'Bulk update or create products from a supplier CSV (stock receipts, price lists)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without writing')
+        parser.add_argument('--reason', help='Reason recorded on the stock movements')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as csv_file:
+                data = csv_file.read()
+        except OSError as e:
+            raise CommandError(str(e))
+
+        reason = options['reason'] or f"Import of {options['path']}"
+        try:
+            summary, errors = import_catalog(data, dry_run=options['dry_run'], reason=reason[:200])
+        except CatalogImportError as e:
+            raise CommandError(str(e))
+
+        if errors:
+            for error in errors:
+                problems = '; '.join(f'{column}: {message}' for column, message in error['errors'].items())
+                self.stderr.write(f"Row {error['row']}: {problems}")
+            raise CommandError(f'{len(errors)} rows have errors; nothing was imported')
+
+        prefix = 'Dry run: would have ' if summary['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}updated {summary['updated']} and created {summary['created']} of {summary['rows']} products, "
+            f"{summary['stock_movements']} stock movements, {summary['availability_changes']} availability changes"
+        ))
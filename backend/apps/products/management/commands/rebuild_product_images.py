@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from PIL import Image
+from apps.products.models import Product
+from apps.products.utils import image_sizes, render_image_variants, store_image_variants
+
+BATCH_SIZE = 50
+
+class Command(BaseCommand):
+    help = 'Render thumbnail variants for product images across a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render products that already have variants')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+        if not options['all']:
+            products = products.filter(image_variants={})
+        product_ids = list(products.values_list('pk', flat=True))
+
+        sizes = image_sizes()
+        done = failed = 0
+        workers = options['workers'] or os.cpu_count() or 1
+        # spawn: workers only decode and encode images and never touch the database
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for offset in range(0, len(product_ids), BATCH_SIZE):
+                batch = list(Product.objects.filter(pk__in=product_ids[offset:offset + BATCH_SIZE]))
+                sources = []
+                for product in batch:
+                    try:
+                        with product.image.open('rb') as source:
+                            sources.append(source.read())
+                    except OSError as e:
+                        self.stderr.write(f'Product {product.pk}: {e}')
+                        sources.append(None)
+
+                jobs = [
+                    pool.submit(render_image_variants, data, sizes) if data is not None else None
+                    for data in sources
+                ]
+                for product, job in zip(batch, jobs):
+                    stored = False
+                    if job is not None:
+                        try:
+                            stored = store_image_variants(product, product.image.name, job.result())
+                        except (OSError, Image.DecompressionBombError) as e:
+                            self.stderr.write(f'Product {product.pk}: {e}')
+                    if stored:
+                        done += 1
+                    else:
+                        failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered variants for {done} products ({failed} skipped)'))
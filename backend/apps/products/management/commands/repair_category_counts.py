@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from apps.products.catalog import bump_catalog_version
+from apps.products.models import Category, Product
+
+class Command(BaseCommand):
+    help = 'Recompute every category\'s available-product count with one GROUP BY'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = dict(
+                Product.objects.filter(availability_status='available').order_by().values_list(
+                    'category_id'
+                ).annotate(count=Count('id'))
+            )
+            categories = list(Category.objects.select_for_update().only('id', 'available_product_count'))
+            drifted = []
+            for category in categories:
+                count = counts.get(category.pk, 0)
+                if category.available_product_count != count:
+                    category.available_product_count = count
+                    drifted.append(category)
+            Category.objects.bulk_update(drifted, ['available_product_count'], batch_size=1000)
+            if drifted:
+                bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {len(categories)} categories, corrected {len(drifted)}'
+        ))
@@ -1,13 +1,36 @@
-from django.db import models
+from collections import Counter
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
 from django.core.validators import MinValueValidator
-from PIL import Image
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .catalog import bump_catalog_version
+from .search import log_product_changes
+from .utils import delete_variant_files, request_image_variants
+
+class CategoryQuerySet(models.QuerySet):
+    def adjust_available_counts(self, deltas):
+        """Add {category_id: delta} to available_product_count with one UPDATE"""
+        deltas = {category_id: delta for category_id, delta in deltas.items() if category_id and delta}
+        if not deltas:
+            return 0
+        return self.filter(pk__in=list(deltas)).update(
+            available_product_count=F('available_product_count') + Case(
+                *[When(pk=category_id, then=Value(delta)) for category_id, delta in deltas.items()],
+                output_field=models.IntegerField(),
+            )
+        )
 
 class Category(models.Model):
     """Product categories like vegetables, fruits, boxes"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # Products with availability_status 'available'; kept in step by Product
+    available_product_count = models.IntegerField(default=0, editable=False)
+    
+    objects = CategoryQuerySet.as_manager()
     
     class Meta:
         verbose_name_plural = "Categories"
@@ -30,13 +53,27 @@ class Product(models.Model):
     stock_quantity = models.PositiveIntegerField(default=0)
     unit = models.CharField(max_length=50, default='kg')  # kg, pieces, boxes, etc.
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # {size: {'width', 'height', 'webp': path, 'jpeg': path}}, filled in by the image pipeline
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     availability_status = models.CharField(max_length=20, choices=AVAILABILITY_CHOICES, default='available')
     low_stock_threshold = models.PositiveIntegerField(default=10)
+    # Last low-stock alert sent, for deduplicating alerts (apps/products/alerts.py)
+    low_stock_alerted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Crossing into low stock waiting for the next digest
+    low_stock_pending_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Partial index holding only low-stock products, for the low-stock listing
+            models.Index(
+                fields=['stock_quantity', 'name'],
+                condition=Q(stock_quantity__lte=F('low_stock_threshold')),
+                name='product_low_stock_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.name} - ${self.price}/{self.unit}"
@@ -51,6 +88,24 @@ class Product(models.Model):
         """Check if product is available for purchase"""
         return self.availability_status == 'available' and self.stock_quantity > 0
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember where this product was counted so save() can move the count
+        instance._saved_listing = (
+            instance.__dict__.get('category_id'), instance.__dict__.get('availability_status')
+        )
+        # ...and which image its variants were rendered from
+        image = instance.__dict__.get('image')
+        instance._saved_image = getattr(image, 'name', image) or ''
+        return instance
+    
+    def _stored_listing(self):
+        saved = getattr(self, '_saved_listing', (None, None))
+        if None in saved:
+            saved = Product.objects.filter(pk=self.pk).values_list('category_id', 'availability_status').first()
+        return saved or (None, None)
+    
     def save(self, *args, **kwargs):
         # Update availability based on stock
         if self.stock_quantity == 0 and self.availability_status == 'available':
@@ -58,15 +113,31 @@ class Product(models.Model):
         elif self.stock_quantity > 0 and self.availability_status == 'out_of_stock':
             self.availability_status = 'available'
         
+        previous = (None, None) if self._state.adding else self._stored_listing()
+        
         super().save(*args, **kwargs)
         
-        # Resize image if it exists
-        if self.image:
-            img = Image.open(self.image.path)
-            if img.height > 800 or img.width > 800:
-                output_size = (800, 800)
-                img.thumbnail(output_size)
-                img.save(self.image.path)
+        # Variants of a replaced or removed image are dropped; new ones are rendered in the background
+        image_name = self.image.name or ''
+        if image_name != getattr(self, '_saved_image', ''):
+            stale_variants = self.image_variants
+            if stale_variants:
+                self.image_variants = {}
+                Product.objects.filter(pk=self.pk).update(image_variants={})
+                storage = self.image.storage
+                transaction.on_commit(lambda: delete_variant_files(storage, stale_variants))
+            self._saved_image = image_name
+            if image_name:
+                request_image_variants(self)
+        
+        # Keep the category's available-product count in step
+        deltas = Counter()
+        if previous[1] == 'available':
+            deltas[previous[0]] -= 1
+        if self.availability_status == 'available':
+            deltas[self.category_id] += 1
+        Category.objects.adjust_available_counts(deltas)
+        self._saved_listing = (self.category_id, self.availability_status)
 
 class StockMovement(models.Model):
     """Track stock changes for inventory management"""
@@ -85,5 +156,48 @@ class StockMovement(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     created_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created_at, id), alone and per product; also serves as-of replays
+            models.Index(fields=['created_at', 'id'], name='movement_created_idx'),
+            models.Index(fields=['product', 'created_at', 'id'], name='movement_product_created_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.product.name} - {self.movement_type} - {self.quantity}"
+
+class StockSnapshot(models.Model):
+    """A product's stock as of taken_at, so as-of queries only replay the movements after it"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    taken_at = models.DateTimeField()
+    stock_quantity = models.PositiveIntegerField()
+    
+    class Meta:
+        # Also the (product, taken_at) index that finds the nearest snapshot
+        unique_together = ('product', 'taken_at')
+    
+    def __str__(self):
+        return f"{self.product_id} at {self.taken_at}: {self.stock_quantity}"
+
+@receiver(post_delete, sender=Product)
+def uncount_deleted_product(sender, instance, **kwargs):
+    category_id, availability_status = getattr(
+        instance, '_saved_listing', (instance.category_id, instance.availability_status)
+    )
+    if availability_status == 'available':
+        Category.objects.adjust_available_counts({category_id: -1})
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    bump_catalog_version()
+
+@receiver([post_save, post_delete], sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    log_product_changes([instance.pk])
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    # Category names are indexed with every product in them
+    if not created:
+        log_product_changes(instance.products.values_list('pk', flat=True))
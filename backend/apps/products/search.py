@@ -0,0 +1,335 @@
+"""In-process product search: an inverted index plus a trigram index.
+
+Every worker process holds its own SearchIndex over product name,
+description and category name. A query token matches indexed words
+exactly, by prefix ("tom" -> "tomatoes") or, for longer tokens, by trigram
+similarity ("tomatoe" -> "tomato"). Products must match every query token
+and are ranked by field weight and match quality.
+
+One and two letter prefixes match too much of the vocabulary to expand per
+query, so each keeps a precomputed bucket of its best SHORT_PREFIX_CANDIDATES
+products; a short term alongside longer ones just filters their matches.
+
+Product and Category writes are appended to a change log in the cache.
+Each process replays the log before searching (at most every
+SEARCH_SYNC_INTERVAL seconds) and re-reads only the changed products, so
+indexes in all workers converge without a rebuild.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from operator import itemgetter
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'description': 1.0}
+PREFIX_QUALITY = 0.8
+FUZZY_QUALITY = 0.6
+FUZZY_MIN_LENGTH = 4
+FUZZY_MIN_SIMILARITY = 0.4
+MAX_PREFIX_EXPANSIONS = 100
+SHORT_PREFIX_LENGTH = 3       # terms shorter than this use the prefix buckets
+SHORT_PREFIX_CANDIDATES = 200
+AVAILABLE_BOOST = 0.5
+MAX_LOG_REPLAY = 5000  # further behind than this, rebuilding is cheaper
+LOG_GAP_GRACE = 10.0  # seconds a numbered log slot may stay unwritten before rebuilding
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """Lowercase, accent-free word tokens"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return TOKEN_RE.findall(text.lower())
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = defaultdict(dict)      # token -> {product_id: field weight}
+        self.grams = defaultdict(set)          # trigram -> tokens
+        self.vocabulary = []                   # sorted tokens, for prefix lookups
+        self.documents = {}                    # product_id -> (tokens, available)
+        self.short_prefixes = {}               # short prefix -> {product_id: score} of its best products
+
+    def __len__(self):
+        return len(self.documents)
+
+    @staticmethod
+    def weigh(name, description, category):
+        """{token: best field weight} for one product"""
+        weights = {}
+        for field, text in (('description', description), ('category', category), ('name', name)):
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), FIELD_WEIGHTS[field])
+        return weights
+
+    def load(self, rows):
+        """Bulk-build an empty index from (id, name, description, category, available) rows"""
+        with self.lock:
+            for product_id, name, description, category, available in rows:
+                weights = self.weigh(name, description, category)
+                for token, weight in weights.items():
+                    self.postings[token][product_id] = weight
+                self.documents[product_id] = (tuple(weights), available)
+            self.vocabulary = sorted(self.postings)
+            for token in self.vocabulary:
+                for gram in trigrams(token):
+                    self.grams[gram].add(token)
+            for prefix in sorted({token[:n] for token in self.vocabulary for n in range(1, SHORT_PREFIX_LENGTH)}):
+                self.build_short_prefix(prefix)
+
+    def add(self, product_id, name, description, category, available=True):
+        """Index a product, replacing any previous version of it"""
+        weights = self.weigh(name, description, category)
+        with self.lock:
+            self.remove(product_id)
+            for token, weight in weights.items():
+                if token not in self.postings:
+                    bisect.insort(self.vocabulary, token)
+                    for gram in trigrams(token):
+                        self.grams[gram].add(token)
+                self.postings[token][product_id] = weight
+            self.documents[product_id] = (tuple(weights), available)
+
+            # Buckets may grow to twice their size before being cut back to the best
+            for prefix in self.short_prefixes_of(weights):
+                bucket = self.short_prefixes.get(prefix)
+                if bucket is None:
+                    continue
+                bucket[product_id] = self.prefix_score(product_id, prefix)
+                if len(bucket) > 2 * SHORT_PREFIX_CANDIDATES:
+                    self.short_prefixes[prefix] = self.best_candidates(bucket)
+
+    def remove(self, product_id):
+        with self.lock:
+            document = self.documents.pop(product_id, None)
+            if document is None:
+                return
+            for prefix in self.short_prefixes_of(document[0]):
+                bucket = self.short_prefixes.get(prefix)
+                if bucket is not None and bucket.pop(product_id, None) is not None:
+                    # Rebuilt on next use once too many of the best have gone
+                    if len(bucket) < SHORT_PREFIX_CANDIDATES // 2:
+                        del self.short_prefixes[prefix]
+            for token in document[0]:
+                postings = self.postings[token]
+                postings.pop(product_id, None)
+                if not postings:
+                    del self.postings[token]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                    for gram in trigrams(token):
+                        self.grams[gram].discard(token)
+
+    @staticmethod
+    def short_prefixes_of(tokens):
+        return {token[:n] for token in tokens for n in range(1, min(len(token) + 1, SHORT_PREFIX_LENGTH))}
+
+    def prefix_score(self, product_id, term):
+        """A product's best weight * quality over its tokens starting with term (0 if none)"""
+        best = 0
+        for token in self.documents[product_id][0]:
+            if token.startswith(term):
+                best = max(best, self.postings[token][product_id] * (1.0 if token == term else PREFIX_QUALITY))
+        return best
+
+    def best_candidates(self, scores):
+        documents = self.documents
+        ranked = {pk: score + AVAILABLE_BOOST if documents[pk][1] else score for pk, score in scores.items()}
+        best = heapq.nlargest(SHORT_PREFIX_CANDIDATES, ranked.items(), key=itemgetter(1))
+        return {pk: scores[pk] for pk, _ in best}
+
+    def build_short_prefix(self, prefix):
+        """The bucket of a short prefix, from every indexed token it starts"""
+        scores = {}
+        for position in range(bisect.bisect_left(self.vocabulary, prefix), len(self.vocabulary)):
+            token = self.vocabulary[position]
+            if not token.startswith(prefix):
+                break
+            quality = 1.0 if token == prefix else PREFIX_QUALITY
+            for product_id, weight in self.postings[token].items():
+                score = weight * quality
+                if score > scores.get(product_id, 0):
+                    scores[product_id] = score
+        bucket = self.short_prefixes[prefix] = self.best_candidates(scores)
+        return bucket
+
+    def expand(self, term):
+        """Indexed tokens matching a query term, with their match quality"""
+        matches = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            matches[token] = 1.0 if token == term else PREFIX_QUALITY
+
+        if term not in matches and len(term) >= FUZZY_MIN_LENGTH:
+            term_grams = trigrams(term)
+            shared = Counter()
+            for gram in term_grams:
+                shared.update(self.grams.get(gram, ()))
+            for token, common in shared.items():
+                if token in matches:
+                    continue
+                similarity = common / (len(term_grams) + len(token) + 1 - common)
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    matches[token] = FUZZY_QUALITY * similarity
+        return matches
+
+    def search(self, query, limit=20):
+        """Product ids matching every query term, best first"""
+        # Longest first, so short terms mostly filter what longer ones matched
+        terms = sorted(dict.fromkeys(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return []
+
+        with self.lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                if len(term) < SHORT_PREFIX_LENGTH:
+                    if scores is None:
+                        bucket = self.short_prefixes.get(term)
+                        if bucket is None:
+                            bucket = self.build_short_prefix(term)
+                        term_scores = dict(bucket)
+                    else:
+                        for product_id in scores:
+                            score = self.prefix_score(product_id, term)
+                            if score:
+                                term_scores[product_id] = score
+                    candidates = ()
+                else:
+                    candidates = self.expand(term).items()
+                for token, quality in candidates:
+                    for product_id, weight in self.postings[token].items():
+                        score = weight * quality
+                        if score > term_scores.get(product_id, 0):
+                            term_scores[product_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores}
+                if not scores:
+                    return []
+
+            for product_id in scores:
+                if self.documents[product_id][1]:
+                    scores[product_id] += AVAILABLE_BOOST
+        return sorted(scores, key=lambda pk: (-scores[pk], pk))[:limit]
+
+# Change log shared by every process, in the same shape as the cart store's dirty log
+
+LOG_PREFIX = 'search:log'
+
+def _cache():
+    return caches[getattr(settings, 'SEARCH_CACHE_ALIAS', 'default')]
+
+def log_product_changes(product_ids):
+    """Tell every process's index to re-read these products once the transaction commits"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+
+    def append():
+        cache = _cache()
+        cache.add(f'{LOG_PREFIX}:seq', 0, None)
+        slot = cache.incr(f'{LOG_PREFIX}:seq')
+        cache.set(f'{LOG_PREFIX}:{slot}', product_ids, 60 * 60 * 24)
+    transaction.on_commit(append)
+
+class ProductSearch:
+    """The process-wide index, built on first use and kept in sync with the log"""
+
+    def __init__(self):
+        self.index = None
+        self.applied = 0
+        self.checked_at = 0.0
+        self.gap = None  # (slot, first seen) of a log slot numbered but not yet written
+        self.build_lock = threading.Lock()
+
+    def documents(self, product_ids=None):
+        from .models import Product
+        products = Product.objects.all()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        return products.values_list(
+            'pk', 'name', 'description', 'category__name', 'availability_status'
+        ).iterator(chunk_size=5000)
+
+    def build(self):
+        index = SearchIndex()
+        applied = _cache().get(f'{LOG_PREFIX}:seq', 0)
+        index.load(
+            (pk, name, description, category, availability_status == 'available')
+            for pk, name, description, category, availability_status in self.documents()
+        )
+        self.index, self.applied, self.gap = index, applied, None
+
+    def sync(self):
+        """Replay changes logged by any process since the last sync"""
+        now = time.monotonic()
+        if now - self.checked_at < getattr(settings, 'SEARCH_SYNC_INTERVAL', 1.0):
+            return
+        self.checked_at = now
+
+        with self.build_lock:
+            cache = _cache()
+            head = cache.get(f'{LOG_PREFIX}:seq', 0)
+            if head == self.applied:
+                return
+            if head - self.applied > MAX_LOG_REPLAY:
+                self.build()
+                return
+            if head < self.applied:
+                # The cache was flushed; start over rather than miss a change
+                self.build()
+                return
+            slots = [f'{LOG_PREFIX}:{slot}' for slot in range(self.applied + 1, head + 1)]
+            entries = cache.get_many(slots)
+
+            # Slots are numbered before they are written, so a missing one just
+            # behind the head is usually still on its way: replay up to it and
+            # retry on the next sync. Only one missing for too long (expired or
+            # never written) costs a rebuild.
+            ready = 0
+            while ready < len(slots) and slots[ready] in entries:
+                ready += 1
+            if ready < len(slots):
+                missing = self.applied + ready + 1
+                if self.gap is None or self.gap[0] != missing:
+                    self.gap = (missing, now)
+                elif now - self.gap[1] > LOG_GAP_GRACE:
+                    self.build()
+                    return
+            else:
+                self.gap = None
+            if ready:
+                self.apply({pk for slot in slots[:ready] for pk in entries[slot]})
+                self.applied += ready
+
+    def apply(self, changed):
+        """Re-read the given products into the index, dropping deleted ones"""
+        found = set()
+        for pk, name, description, category, availability_status in self.documents(changed):
+            self.index.add(pk, name, description, category, availability_status == 'available')
+            found.add(pk)
+        for pk in changed - found:
+            self.index.remove(pk)
+
+    def search(self, query, limit=20):
+        if self.index is None:
+            with self.build_lock:
+                if self.index is None:
+                    self.build()
+        self.sync()
+        return self.index.search(query, limit)
+
+product_search = ProductSearch()
@@ -1,27 +1,39 @@
 from rest_framework import serializers
 from .models import Product, Category, StockMovement
+from .utils import IMAGE_FORMATS
+from .alerts import is_low, note_stock_changes
 
 class CategorySerializer(serializers.ModelSerializer):
     """Serializer for product categories"""
-    product_count = serializers.SerializerMethodField()
+    product_count = serializers.IntegerField(source='available_product_count', read_only=True)
     
     class Meta:
         model = Category
         fields = '__all__'
-    
-    def get_product_count(self, obj):
-        return obj.products.filter(availability_status='available').count()
 
 class ProductSerializer(serializers.ModelSerializer):
     """Serializer for products"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     is_low_stock = serializers.ReadOnlyField()
     is_available = serializers.ReadOnlyField()
+    image_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = '__all__'
     
+    def get_image_variants(self, obj):
+        """{size: {width, height, webp, jpeg}} with URLs; empty until the variants are rendered"""
+        request = self.context.get('request')
+        storage = obj.image.storage
+        variants = {}
+        for name, entry in obj.image_variants.items():
+            variants[name] = {'width': entry['width'], 'height': entry['height']}
+            for extension, _, _ in IMAGE_FORMATS:
+                url = storage.url(entry[extension])
+                variants[name][extension] = request.build_absolute_uri(url) if request else url
+        return variants
+    
     def validate_price(self, value):
         if value <= 0:
             raise serializers.ValidationError("Price must be greater than 0")
@@ -43,6 +55,7 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         # Track stock changes
         old_stock = instance.stock_quantity
         new_stock = validated_data.get('stock_quantity', old_stock)
+        was_low = is_low(old_stock, instance.low_stock_threshold)
         
         if old_stock != new_stock:
             # Create stock movement record
@@ -56,7 +69,9 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
                 created_by=self.context['request'].user
             )
         
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        note_stock_changes([(instance.pk, was_low, is_low(instance.stock_quantity, instance.low_stock_threshold))])
+        return instance
 
 class StockMovementSerializer(serializers.ModelSerializer):
     """Serializer for stock movements"""
@@ -5,8 +5,15 @@ urlpatterns = [
     path('categories/', views.CategoryListCreateView.as_view(), name='category-list'),
     path('categories/<int:pk>/', views.CategoryDetailView.as_view(), name='category-detail'),
     path('', views.ProductListCreateView.as_view(), name='product-list'),
+    path('search/', views.search_products, name='product-search'),
     path('<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
+    path('<int:pk>/stock/', views.product_stock_as_of, name='product-stock-as-of'),
+    path('import/', views.import_products, name='product-import'),
     path('low-stock/', views.low_stock_products, name='low-stock'),
     path('stock-movements/', views.stock_movements, name='stock-movements'),
+    path('stock-movements/export/', views.export_stock_movements_view, name='stock-movement-export'),
     path('analytics/', views.product_analytics, name='product-analytics'),
+    path('analytics/top/', views.top_products_view, name='product-analytics-top'),
+    path('analytics/slow-movers/', views.slow_movers_view, name='product-analytics-slow-movers'),
+    path('analytics/categories/', views.category_revenue_view, name='product-analytics-categories'),
 ]
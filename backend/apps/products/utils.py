@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from celery import shared_task
+from PIL import Image, ImageOps
+import io
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Bounding box (px) of each generated size; originals are never modified
+DEFAULT_IMAGE_SIZES = {'thumb': 150, 'small': 400, 'large': 800}
+
+IMAGE_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+
+def image_sizes():
+    return getattr(settings, 'PRODUCT_IMAGE_SIZES', DEFAULT_IMAGE_SIZES)
+
+def _flatten(image):
+    """RGB copy of an image, with any transparency composited onto white"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+def render_image_variants(data, sizes):
+    """Resize image bytes into every size and encode each as WebP and JPEG
+
+    Pure function of its arguments, so it can run in any worker process.
+    Returns {size: {'width', 'height', 'webp': bytes, 'jpeg': bytes}}.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        source = _flatten(ImageOps.exif_transpose(source))
+
+    variants = {}
+    for name, box in sizes.items():
+        image = source.copy()
+        image.thumbnail((box, box), Image.LANCZOS)  # only ever shrinks
+        entry = {'width': image.width, 'height': image.height}
+        for extension, image_format, options in IMAGE_FORMATS:
+            output = io.BytesIO()
+            image.save(output, image_format, **options)
+            entry[extension] = output.getvalue()
+        variants[name] = entry
+    return variants
+
+def delete_variant_files(storage, variants):
+    for entry in variants.values():
+        for extension, _, _ in IMAGE_FORMATS:
+            if entry.get(extension):
+                storage.delete(entry[extension])
+
+def store_image_variants(product, source_name, variants):
+    """Save rendered variants and record them on the product, unless its image changed meanwhile"""
+    from .catalog import bump_catalog_version
+    from .models import Product
+    storage = product.image.storage
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+
+    record = {}
+    for name, entry in variants.items():
+        record[name] = {'width': entry['width'], 'height': entry['height']}
+        for extension, _, _ in IMAGE_FORMATS:
+            record[name][extension] = storage.save(
+                f'products/variants/{product.pk}/{stem}-{name}.{extension}', ContentFile(entry[extension])
+            )
+
+    previous = Product.objects.filter(pk=product.pk).values_list('image_variants', flat=True).first() or {}
+    updated = Product.objects.filter(pk=product.pk, image=source_name).update(image_variants=record)
+    if not updated:
+        # A newer image arrived while this one was rendering
+        delete_variant_files(storage, record)
+        return False
+    delete_variant_files(storage, previous)
+    bump_catalog_version()
+    return True
+
+def request_image_variants(product):
+    """Queue variant generation for the product's current image after the transaction commits"""
+    product_id, image_name = product.pk, product.image.name
+    transaction.on_commit(lambda: process_product_image_task.delay(product_id, image_name))
+
+@shared_task
+def process_product_image_task(product_id, image_name):
+    """Generate the thumbnail variants of a product image"""
+    from .models import Product
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or product.image.name != image_name:
+        return False
+
+    try:
+        with product.image.open('rb') as source:
+            variants = render_image_variants(source.read(), image_sizes())
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.error(f"Failed to process image for product {product_id}: {str(e)}")
+        return False
+
+    return store_image_variants(product, image_name, variants)
+
+@shared_task
+def send_low_stock_digest_task():
+    """Email the low-stock alerts collected during the last window"""
+    from .alerts import send_pending_alerts
+    return send_pending_alerts()
+
+@shared_task
+def take_stock_snapshots_task():
+    """Snapshot the stock of products that moved since the last run"""
+    from .ledger import take_snapshots
+    return take_snapshots()
+
+@shared_task
+def update_reorder_points_task():
+    """Re-forecast demand and move every low_stock_threshold to its reorder point"""
+    from .forecasting import apply_thresholds, reorder_report
+    return apply_thresholds(reorder_report())
@@ -0,0 +1,257 @@
+from rest_framework import generics, permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.db.models import Count, F, Q, Sum
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time
+from .models import Category, Product, StockMovement
+from .serializers import (CategorySerializer, ProductSerializer, ProductCreateUpdateSerializer,
+                          StockMovementSerializer)
+from .catalog import CachedCatalogMixin
+from .search import product_search
+from .imports import CatalogImportError, import_catalog
+from .ledger import stock_as_of
+from apps.accounts.views import AdminOnlyPermission
+from apps.orders.analytics import (PRODUCT_RANKINGS, category_revenue, default_window, parse_date_range,
+                                   slow_movers, top_products)
+from apps.orders.exports import export_stock_movements, streaming_export
+from apps.orders.pagination import KeysetPagination
+
+class AdminOrReadOnlyPermission(permissions.BasePermission):
+    """Any signed-in user may browse the catalog; only admins may change it"""
+    def has_permission(self, request, view):
+        if not request.user.is_authenticated:
+            return False
+        return request.method in permissions.SAFE_METHODS or request.user.user_type == 'admin'
+
+def filter_products(queryset, params):
+    """Apply category, availability_status and ?available=true filters"""
+    if params.get('category', '').isdigit():
+        queryset = queryset.filter(category_id=int(params['category']))
+    
+    if params.get('availability_status'):
+        queryset = queryset.filter(availability_status=params['availability_status'])
+    
+    if params.get('available') in ('1', 'true'):
+        queryset = queryset.filter(availability_status='available', stock_quantity__gt=0)
+    
+    return queryset
+
+class CategoryListCreateView(CachedCatalogMixin, generics.ListCreateAPIView):
+    """List categories or create a new one"""
+    serializer_class = CategorySerializer
+    permission_classes = [AdminOrReadOnlyPermission]
+    queryset = Category.objects.order_by('name')
+    # Categories are few; one unpaginated SELECT answers the whole list
+    pagination_class = None
+
+class CategoryDetailView(CachedCatalogMixin, generics.RetrieveUpdateDestroyAPIView):
+    """Retrieve, update or delete a category"""
+    serializer_class = CategorySerializer
+    permission_classes = [AdminOrReadOnlyPermission]
+    queryset = Category.objects.all()
+    
+    def destroy(self, request, *args, **kwargs):
+        category = self.get_object()
+        # Deleting would cascade to the products and their order history
+        if category.products.exists():
+            return Response({'error': 'Category still has products'},
+                           status=status.HTTP_400_BAD_REQUEST)
+        category.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ProductListCreateView(CachedCatalogMixin, generics.ListCreateAPIView):
+    """List products or create new product"""
+    permission_classes = [AdminOrReadOnlyPermission]
+    
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return ProductCreateUpdateSerializer
+        return ProductSerializer
+    
+    def get_queryset(self):
+        queryset = Product.objects.select_related('category')
+        return filter_products(queryset, self.request.query_params)
+
+class ProductDetailView(CachedCatalogMixin, generics.RetrieveUpdateDestroyAPIView):
+    """Retrieve, update or discontinue a product"""
+    permission_classes = [AdminOrReadOnlyPermission]
+    queryset = Product.objects.select_related('category')
+    
+    def get_serializer_class(self):
+        if self.request.method in ('PUT', 'PATCH'):
+            return ProductCreateUpdateSerializer
+        return ProductSerializer
+    
+    def destroy(self, request, *args, **kwargs):
+        # Order items reference the product, so it is discontinued rather than deleted
+        product = self.get_object()
+        product.availability_status = 'discontinued'
+        product.save()
+        return Response({'message': 'Product discontinued successfully'})
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def search_products(request):
+    """Ranked product search over name, description and category (?q=, ?limit=)"""
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+    
+    product_ids = product_search.search(query, limit) if query else []
+    products = Product.objects.select_related('category').in_bulk(product_ids)
+    serializer = ProductSerializer([products[pk] for pk in product_ids if pk in products], many=True)
+    return Response({'query': query, 'results': serializer.data})
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def low_stock_products(request):
+    """Products at or below their low-stock threshold, read from the partial low-stock index"""
+    products = Product.objects.select_related('category').filter(
+        stock_quantity__lte=F('low_stock_threshold')
+    ).exclude(availability_status='discontinued').order_by('stock_quantity', 'name')
+    serializer = ProductSerializer(products, many=True)
+    return Response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def stock_movements(request):
+    """Stock movement history, newest first (?product= to filter, ?pagination=cursor for keyset pages)"""
+    params = request.query_params
+    movements = StockMovement.objects.select_related('product', 'created_by').order_by('-created_at', '-id')
+    if params.get('product', '').isdigit():
+        movements = movements.filter(product_id=int(params['product']))
+    
+    # Keyset pages walk the (product,) created_at, id index, so deep pages cost no more than the first
+    if params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params:
+        paginator = KeysetPagination()
+    else:
+        paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    page = paginator.paginate_queryset(movements, request)
+    serializer = StockMovementSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def product_stock_as_of(request, pk):
+    """A product's stock at a past moment (?at= ISO datetime, or a date for the end of that day)"""
+    product = get_object_or_404(Product, pk=pk)
+    value = request.query_params.get('at', '')
+    moment = timezone.now()
+    if value:
+        try:
+            moment = parse_datetime(value)
+            day = parse_date(value) if moment is None else None
+        except ValueError:
+            moment = day = None
+        if day is not None:
+            moment = datetime.combine(day, time.max)
+        if moment is None:
+            return Response({'error': 'Use an ISO datetime or YYYY-MM-DD for at'},
+                           status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+    
+    stock = stock_as_of(product, moment)
+    if stock is None:
+        return Response({'error': 'The product did not exist yet'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'product': product.pk, 'at': moment, **stock})
+
+def _sales_window(request):
+    """(start, end, limit) from ?start=, ?end= (default: the last 30 days) and ?limit="""
+    start, end = default_window(*parse_date_range(request.query_params))
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+    except ValueError:
+        limit = 10
+    return start, end, limit
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def product_analytics(request):
+    """Catalog stock overview plus sales velocity over a window, from the product sales rollup"""
+    data = Product.objects.aggregate(
+        total_products=Count('id'),
+        available_products=Count('id', filter=Q(availability_status='available', stock_quantity__gt=0)),
+        out_of_stock_products=Count('id', filter=Q(stock_quantity=0)),
+        low_stock_products=Count('id', filter=Q(stock_quantity__lte=F('low_stock_threshold'))),
+        total_units=Sum('stock_quantity'),
+    )
+    data['total_units'] = data['total_units'] or 0
+    
+    start, end, limit = _sales_window(request)
+    data['window'] = {'start': start, 'end': end}
+    data['top_products'] = top_products(start, end, limit)
+    data['slow_movers'] = slow_movers(start, end, limit)
+    data['category_revenue'] = category_revenue(start, end)
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def top_products_view(request):
+    """Best sellers over ?start=/?end= (?by=units|revenue, ?limit=)"""
+    by = request.query_params.get('by', 'units')
+    if by not in PRODUCT_RANKINGS:
+        return Response({'error': f"by must be one of {', '.join(PRODUCT_RANKINGS)}"},
+                       status=status.HTTP_400_BAD_REQUEST)
+    start, end, limit = _sales_window(request)
+    return Response({'start': start, 'end': end, 'results': top_products(start, end, limit, by)})
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def slow_movers_view(request):
+    """Products on sale that sold least over ?start=/?end= (?limit=)"""
+    start, end, limit = _sales_window(request)
+    return Response({'start': start, 'end': end, 'results': slow_movers(start, end, limit)})
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def category_revenue_view(request):
+    """Units and revenue per category over ?start=/?end="""
+    start, end, _ = _sales_window(request)
+    return Response({'start': start, 'end': end, 'results': category_revenue(start, end)})
+
+@api_view(['POST'])
+@permission_classes([AdminOnlyPermission])
+def import_products(request):
+    """Bulk update or create products from an uploaded CSV (?dry_run=true to only validate)"""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Upload the CSV as the "file" field'},
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    dry_run = str(request.query_params.get('dry_run', request.data.get('dry_run', ''))).lower() in ('1', 'true')
+    try:
+        summary, errors = import_catalog(
+            upload.read(), user=request.user, dry_run=dry_run, reason=f'Import of {upload.name}'[:200]
+        )
+    except CatalogImportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if errors:
+        return Response({'error': 'The file has errors; nothing was imported', 'rows': errors},
+                       status=status.HTTP_400_BAD_REQUEST)
+    return Response(summary)
+
+@api_view(['GET'])
+@permission_classes([AdminOnlyPermission])
+def export_stock_movements_view(request):
+    """Stream stock movements (?export=ndjson|csv, ?product=, ?start=, ?end=)"""
+    params = request.query_params
+    start, end = parse_date_range(params)
+    movements = StockMovement.objects.all()
+    
+    if params.get('product', '').isdigit():
+        movements = movements.filter(product_id=int(params['product']))
+    if start:
+        movements = movements.filter(created_at__date__gte=start)
+    if end:
+        movements = movements.filter(created_at__date__lte=end)
+    
+    export_format = params.get('export', 'ndjson')
+    return streaming_export(export_stock_movements(movements, export_format), 'stock_movements', export_format)
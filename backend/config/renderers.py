@@ -0,0 +1,60 @@
+"""JSON renderer and parser backed by orjson, with DRF's own as the fallback.
+
+Output matches rest_framework.renderers.JSONRenderer with the default
+settings (compact, UTF-8, DRF's encoder for Decimal, dates, UUIDs and
+everything else orjson does not handle natively). Whenever orjson is not
+installed or cannot handle a request (indentation, a non-UTF-8 charset,
+integers beyond 64 bits) the stock implementation is used.
+"""
+from django.conf import settings
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - pure-Python fallback
+    orjson = None
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """Drop-in JSONRenderer that serializes with orjson when it can"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.can_use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                # Let DRF's encoder format dates/times so output matches exactly
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except (TypeError, orjson.JSONEncodeError):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping as JSONRenderer: U+2028/U+2029 are valid JSON but not JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def can_use_orjson(self, accepted_media_type, renderer_context):
+        return (
+            self.get_indent(accepted_media_type, renderer_context or {}) is None
+            and self.ensure_ascii is False
+            and self.compact
+            and issubclass(self.encoder_class, encoders.JSONEncoder)
+        )
+
+class FastJSONParser(parsers.JSONParser):
+    """Drop-in JSONParser that decodes UTF-8 bodies with orjson"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8' or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
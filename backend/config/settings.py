@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # Initialize environment variables
 env = environ.Env(
@@ -81,6 +82,12 @@ DATABASES = {
     }
 }
 
+# Order/invoice number blocks are leased on their own connection so a lease
+# commits even when the request that triggered it rolls back
+DATABASES['numbering'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+NUMBERING_DB_ALIAS = 'numbering'
+NUMBER_BLOCK_SIZE = env.int('NUMBER_BLOCK_SIZE', default=50)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -125,6 +132,15 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'config.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'config.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
@@ -149,6 +165,81 @@ DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='noreply@freshproduce.com
 # Celery configuration for background tasks
 CELERY_BROKER_URL = env('REDIS_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = env('REDIS_URL', default='redis://localhost:6379/0')
+CELERY_BEAT_SCHEDULE = {
+    'flush-carts': {
+        'task': 'apps.orders.utils.flush_carts_task',
+        'schedule': 60.0,
+    },
+    'sweep-carts': {
+        'task': 'apps.orders.utils.sweep_carts_task',
+        'schedule': 60.0 * 60 * 6,
+    },
+    'expire-reservations': {
+        'task': 'apps.orders.utils.expire_reservations_task',
+        'schedule': 60.0,
+    },
+    'snapshot-stock': {
+        'task': 'apps.products.utils.take_stock_snapshots_task',
+        'schedule': 60.0 * 60 * 24,
+    },
+    'update-reorder-points': {
+        'task': 'apps.products.utils.update_reorder_points_task',
+        'schedule': 60.0 * 60 * 24,
+    },
+}
+
+# Cache shared by every worker: live carts, the catalog version, the search change
+# log and the low-stock digest keys all live here, so it must be Redis outside DEBUG
+CACHE_URL = env('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif DEBUG:
+    # Single-process development server only; never cull, or unflushed carts are lost
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+        }
+    }
+else:
+    raise ImproperlyConfigured('CACHE_URL must point at a Redis server when DEBUG is off')
+
+# Cached catalog pages (apps/products/catalog.py)
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TTL = 60 * 60 * 24
+
+# In-process product search (apps/products/search.py)
+SEARCH_CACHE_ALIAS = 'default'
+SEARCH_SYNC_INTERVAL = 1.0
+
+# Low-stock alerts (apps/products/alerts.py): one alert per product per cooldown,
+# batched into one digest email per window
+LOW_STOCK_ALERT_COOLDOWN = env.int('LOW_STOCK_ALERT_COOLDOWN', default=6 * 60 * 60)
+LOW_STOCK_DIGEST_WINDOW = env.int('LOW_STOCK_DIGEST_WINDOW', default=5 * 60)
+
+# Stock snapshots (apps/products/ledger.py) are taken this many seconds behind
+# the clock, so movements still in flight are never skipped
+STOCK_SNAPSHOT_LAG = env.int('STOCK_SNAPSHOT_LAG', default=60 * 60)
+
+# Demand forecasting and reorder points (apps/products/forecasting.py)
+FORECAST_HISTORY_DAYS = env.int('FORECAST_HISTORY_DAYS', default=365)
+FORECAST_WINDOW_DAYS = env.int('FORECAST_WINDOW_DAYS', default=28)
+REORDER_LEAD_TIME_DAYS = env.int('REORDER_LEAD_TIME_DAYS', default=2)
+REORDER_COVER_DAYS = env.int('REORDER_COVER_DAYS', default=3)
+REORDER_SERVICE_LEVEL = env.float('REORDER_SERVICE_LEVEL', default=0.95)
+
+# Cart store (apps/orders/cart_store.py)
+CART_CACHE_ALIAS = 'default'
+CART_TTL = 60 * 60 * 24 * 14
+CART_ABANDON_AFTER_DAYS = env.int('CART_ABANDON_AFTER_DAYS', default=30)
+
+# Seconds a cart line holds its stock (apps/orders/reservations.py)
+STOCK_RESERVATION_TTL = env.int('STOCK_RESERVATION_TTL', default=15 * 60)
 
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True